@@ -1,19 +1,29 @@
 import os
 import uuid
+import base64
+import binascii
 import logging
 import tempfile
 import threading
 import queue
 import time
 import csv
+import wave
+import io
+import re
+import secrets
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import shutil
 import requests
-from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 import subprocess
 import json
-from flask import Flask, request, jsonify, render_template, send_file, flash, redirect, url_for
+from flask import Flask, Request, Response, request, jsonify, render_template, send_file, flash
 from werkzeug.utils import secure_filename
-from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 
 # Import our new FFmpeg-based video creation module
 import csv_to_video_ffmpeg
@@ -26,181 +36,496 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 
-# Queue system for bulk conversion
-conversion_queue = queue.Queue()
+# Queue system for bulk conversion. Entries are never mutated in place:
+# writers publish a new dict per update, so readers can look up an entry
+# (or take queue_status.copy()) without locking. queue_lock only serializes
+# the writers' read-modify-write.
 queue_status = {}  # Track status of each file in queue
 queue_lock = threading.Lock()
+# Each write bumps queue_version and records it per file so /api/queue-events
+# can push just the entries that changed since a client's last event
+queue_version = 0
+queue_versions = {}
+queue_changed = threading.Condition(queue_lock)
+QUEUE_EVENT_INTERVAL = 0.2  # seconds; updates within this window go out as one event
+QUEUE_EVENT_KEEPALIVE = 15  # seconds between keep-alive comments on an idle stream
+# Each open stream pins a worker thread and only sees this process's queue, so the
+# stream is opt-in (single-worker deployments) and ends after QUEUE_EVENT_MAX_AGE
+QUEUE_EVENTS_ENABLED = os.environ.get('QUEUE_EVENTS', 'false').lower() == 'true'
+QUEUE_EVENT_MAX_AGE = int(os.environ.get('QUEUE_EVENT_MAX_AGE', 300))  # seconds
 
 # Clear queue status on startup
 with queue_lock:
     queue_status.clear()
 
-# Configuration for concurrent processing
-MAX_CONCURRENT_CONVERSIONS = 2
-active_conversions = 0
-active_conversions_lock = threading.Lock()
+# Configuration for concurrent processing; the pool's own work queue holds pending jobs.
+# Each job is a separate ffmpeg process, so threads are enough to use several cores.
+MAX_CONCURRENT_CONVERSIONS = int(os.environ.get('FFMPEG_WORKERS', max(2, (os.cpu_count() or 4) // 2)))
+conversion_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CONVERSIONS, thread_name_prefix='convert')
 
-def update_queue_status(file_id, status, message=None, download_url=None, filename=None):
+# Async CSV batches (/api/csv-to-video?async=true) are tracked apart from the WebM queue and run
+# on their own pool, so they neither show up in the bulk-queue listing nor hold conversion slots.
+# Like queue_status, csv_jobs entries are replaced rather than mutated and live in this process only.
+csv_jobs = {}
+csv_jobs_lock = threading.Lock()
+CSV_JOB_WORKERS = int(os.environ.get('CSV_JOB_WORKERS', 1))
+# Finished batches stay pollable this long (seconds) before their record is dropped
+CSV_JOB_TTL = int(os.environ.get('CSV_JOB_TTL', 3600))
+csv_pool = ThreadPoolExecutor(max_workers=CSV_JOB_WORKERS, thread_name_prefix='csv-job')
+
+def update_queue_status(file_id, status, message=None, download_url=None, filename=None, product_videos=None):
     """Update the status of a file in the queue."""
-    with queue_lock:
-        if file_id not in queue_status:
-            queue_status[file_id] = {
+    global queue_version
+    with queue_changed:
+        current = queue_status.get(file_id)
+        if current is None:
+            entry = {
                 'status': status,
                 'message': message or '',
                 'download_url': download_url,
                 'filename': filename,
-                'timestamp': time.time()
             }
         else:
-            queue_status[file_id]['status'] = status
+            entry = dict(current, status=status)
             if message:
-                queue_status[file_id]['message'] = message
+                entry['message'] = message
             if download_url:
-                queue_status[file_id]['download_url'] = download_url
+                entry['download_url'] = download_url
             if filename:
-                queue_status[file_id]['filename'] = filename
-            queue_status[file_id]['timestamp'] = time.time()
+                entry['filename'] = filename
+        if product_videos is not None:
+            entry['product_videos'] = product_videos
+        entry['timestamp'] = time.time()
+        queue_status[file_id] = entry
+        _write_status_file(file_id, entry)
+        queue_version += 1
+        queue_versions[file_id] = queue_version
+        queue_changed.notify_all()
+
+# queue_status only exists in the worker process that accepted the upload, so every
+# update is also published as <UPLOAD_FOLDER>/<file_id>_status.json for the other workers
+def _status_file_path(file_id):
+    return os.path.join(UPLOAD_FOLDER, f"{file_id}_status.json")
+
+def _write_status_file(file_id, entry):
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_FOLDER, suffix='.status.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        # Publish atomically so readers never see a partial file
+        os.replace(tmp_path, _status_file_path(file_id))
+    except OSError as e:
+        logger.warning("Could not write status file for %s: %s", file_id, e)
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def job_status(file_id):
+    """Return a queued job's status entry from this worker or its status file, or None."""
+    entry = queue_status.get(file_id)
+    if entry is not None:
+        return entry
+    try:
+        with open(_status_file_path(file_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-def process_conversion_queue():
-    """Worker function to process conversion queue."""
-    global active_conversions
+def process_conversion(item):
+    """Convert one queued file; runs on a conversion pool thread."""
+    file_id = item['file_id']
+    input_path = item['input_path']
+    output_path = item['output_path']
+    original_filename = item['original_filename']
     
-    while True:
-        try:
-            # Get item from queue (blocking)
-            item = conversion_queue.get()
-            if item is None:  # Sentinel to stop worker
-                break
-                
-            file_id = item['file_id']
-            input_path = item['input_path']
-            output_path = item['output_path']
-            original_filename = item['original_filename']
-            
-            # Update status to processing
-            update_queue_status(file_id, 'processing', 'Conversion in progress...')
-            
-            # Check if we can start a new conversion
-            with active_conversions_lock:
-                if active_conversions >= MAX_CONCURRENT_CONVERSIONS:
-                    # Put back in queue and wait
-                    conversion_queue.put(item)
-                    time.sleep(1)
-                    continue
-                active_conversions += 1
+    # Update status to processing; the fragmented output can be downloaded as it is written
+    update_queue_status(file_id, 'processing', 'Conversion in progress...', f"/api/download/{file_id}")
+    
+    try:
+        # Convert the file
+        success, message = convert_webm_to_mp4(input_path, output_path, item.get('remux', False), fragmented=True)
+        
+        if success:
+            update_queue_status(
+                file_id, 
+                'completed', 
+                'Conversion completed successfully',
+                f"/api/download/{file_id}",
+                original_filename
+            )
+        else:
+            update_queue_status(file_id, 'error', message)
             
-            try:
-                # Convert the file
-                success, message = convert_webm_to_mp4(input_path, output_path)
-                
-                if success:
-                    update_queue_status(
-                        file_id, 
-                        'completed', 
-                        'Conversion completed successfully',
-                        f"/api/download/{file_id}",
-                        original_filename
-                    )
-                else:
-                    update_queue_status(file_id, 'error', message)
-                    
-            except Exception as e:
-                logger.error(f"Error processing file {file_id}: {str(e)}")
-                update_queue_status(file_id, 'error', f"Processing error: {str(e)}")
-            finally:
-                # Clean up input file
-                cleanup_file(input_path)
-                
-                # Decrement active conversions
-                with active_conversions_lock:
-                    active_conversions -= 1
-                    
-                # Mark task as done
-                conversion_queue.task_done()
-                
-        except Exception as e:
-            logger.error(f"Queue processing error: {str(e)}")
-            time.sleep(1)
+    except Exception as e:
+        logger.error("Error processing file %s: %s", file_id, e)
+        update_queue_status(file_id, 'error', f"Processing error: {str(e)}")
+    finally:
+        # Clean up input file
+        cleanup_file(input_path)
 
-# Start queue processing worker thread
-queue_worker = threading.Thread(target=process_conversion_queue, daemon=True)
-queue_worker.start()
+def update_csv_job(file_id, status, message, **fields):
+    """Publish a new status entry for an async CSV batch, dropping finished ones past CSV_JOB_TTL."""
+    now = time.time()
+    with csv_jobs_lock:
+        expired = [job_id for job_id, job in csv_jobs.items()
+                   if job['status'] in ('completed', 'error') and now - job['timestamp'] > CSV_JOB_TTL]
+        for job_id in expired:
+            del csv_jobs[job_id]
+        csv_jobs[file_id] = dict(csv_jobs.get(file_id, {}), status=status, message=message,
+                                 timestamp=now, **fields)
 
+def process_csv_job(item):
+    """Render the product videos for one queued CSV upload; runs on a CSV pool thread."""
+    file_id = item['file_id']
+    update_csv_job(file_id, 'processing', 'Creating product videos...')
+    try:
+        success, result = csv_to_video_ffmpeg.process_csv_and_create_videos(
+            item['input_path'], item['output_dir'], *item['params'])
+        if success:
+            product_videos = register_product_videos(file_id, result)
+            update_csv_job(file_id, 'completed', f'Created {len(product_videos)} product videos',
+                           product_videos=product_videos)
+        else:
+            update_csv_job(file_id, 'error', result[0].get('message', 'Failed to create videos'))
+    except Exception as e:
+        logger.error("Error processing CSV %s: %s", file_id, e)
+        update_csv_job(file_id, 'error', f"Processing error: {str(e)}")
+    finally:
+        cleanup_file(item['input_path'])
+
+def queued_count(statuses=None):
+    """Number of jobs still waiting for a conversion slot, from a queue_status snapshot."""
+    if statuses is None:
+        statuses = queue_status.copy()
+    return sum(1 for status_info in statuses.values() if status_info['status'] == 'queued')
+
+
+# CORS headers added to every response, built once
+CORS_HEADERS = [
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Headers', 'Content-Type,Authorization'),
+    ('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS'),
+]
 
 # Add CORS headers to all responses
 @app.after_request
 def after_request(response):
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    response.headers.extend(CORS_HEADERS)
     return response
 
 # Configuration
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
+# Let nginx/apache serve downloads via X-Sendfile when deployed behind one
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
+# Or let nginx serve them: an internal location aliased to UPLOAD_FOLDER, e.g. /_protected/
+X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX', '')
 UPLOAD_FOLDER = tempfile.gettempdir()
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB chunks when streaming raw uploads to disk
+UPLOAD_SPOOL_THRESHOLD = 500 * 1024  # Werkzeug's own in-memory limit for multipart parts
+
+class UploadRequest(Request):
+    """Request that spools large multipart file parts into UPLOAD_FOLDER.
+
+    With the spool file on the same filesystem as the job files,
+    save_upload can hard-link it into place instead of copying the upload
+    a second time.
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is None or total_content_length > UPLOAD_SPOOL_THRESHOLD:
+            return tempfile.NamedTemporaryFile('w+b', dir=UPLOAD_FOLDER, prefix='upload_')
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+app.request_class = UploadRequest
 ALLOWED_EXTENSIONS = {'webm', 'csv'}
+ALLOWED_SUFFIXES = tuple(f'.{ext}' for ext in ALLOWED_EXTENSIONS)
+SUFFIX_LEN = max(len(suffix) for suffix in ALLOWED_SUFFIXES)
+WEBM_SUFFIXES = ('.webm',)
+CSV_SUFFIXES = ('.csv',)
+# EBML magic shared by WebM and Matroska files; the DocType follows within the first few dozen bytes
+EBML_MAGIC = b'\x1a\x45\xdf\xa3'
+WEBM_HEADER_SIZE = 64
+# The Tracks element (holding each CodecID) normally sits within the first few KB
+WEBM_SNIFF_SIZE = 64 * 1024
+H264_CODEC_ID = b'V_MPEG4/ISO/AVC'
+
+def allowed_file(filename, suffixes=ALLOWED_SUFFIXES):
+    """Check if the uploaded file has one of the given extensions (any allowed one by default)."""
+    # Only the tail can match, so lowercase just that instead of the whole name
+    return filename is not None and filename[-SUFFIX_LEN:].lower().endswith(suffixes)
+
+# Names secure_filename() would return unchanged: ASCII word characters, dots and dashes,
+# not starting or ending with '.' or '_' (which it strips)
+SAFE_FILENAME_RE = re.compile(r'(?![._])[\w.-]{1,255}(?<![._])\Z', re.ASCII)
+
+def safe_filename(filename, default):
+    """secure_filename() with a fast path for names that are already safe."""
+    filename = filename or default
+    if SAFE_FILENAME_RE.match(filename):
+        return filename
+    return secure_filename(filename)
 
-def allowed_file(filename):
-    """Check if the uploaded file has an allowed extension."""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+def is_webm_header(head):
+    """Check leading file bytes for the EBML magic and a webm/matroska DocType."""
+    head = head[:WEBM_HEADER_SIZE]
+    return head.startswith(EBML_MAGIC) and (b'webm' in head or b'matroska' in head)
 
-def validate_webm_file(file_path):
-    """Validate that the uploaded file is actually a webm video file."""
+def has_h264_video(head):
+    """Check leading file bytes for an H.264 track, which MP4 can take without re-encoding."""
+    return H264_CODEC_ID in head
+
+# Hardware H.264 encoders in order of preference; libx264 is the CPU fallback
+HW_ENCODERS = ('h264_nvenc', 'h264_qsv', 'h264_videotoolbox', 'h264_vaapi')
+VAAPI_DEVICE = os.environ.get('VAAPI_DEVICE', '/dev/dri/renderD128')
+X264_PRESET = os.environ.get('X264_PRESET', 'faster')
+# Split the cores between concurrently running conversions instead of letting each ffmpeg take them all
+FFMPEG_THREADS = os.environ.get('FFMPEG_THREADS_PER_INVOCATION') or str(max(1, (os.cpu_count() or 4) // MAX_CONCURRENT_CONVERSIONS))
+
+# An absolute ffmpeg path lets subprocess use posix_spawn (it won't for a bare name)
+FFMPEG_BIN = shutil.which('ffmpeg') or 'ffmpeg'
+
+# Only the end of ffmpeg's log is kept for error messages
+STDERR_TAIL_SIZE = 64 * 1024
+
+def _read_stderr_tail(f):
+    """Return the last STDERR_TAIL_SIZE bytes written to a stderr temp file as text."""
+    size = f.seek(0, os.SEEK_END)
+    f.seek(max(0, size - STDERR_TAIL_SIZE))
+    return f.read().decode('utf-8', errors='replace')
+
+def run_ffmpeg(cmd, timeout):
+    """Run an ffmpeg command, returning a CompletedProcess with the tail of its stderr.
+
+    stderr goes to a temp file rather than an in-memory pipe buffer, so a
+    long encode's log doesn't grow the worker's memory. ffmpeg only needs
+    stdio and Python's own descriptors are non-inheritable, so
+    close_fds=False is safe and lets CPython spawn via posix_spawn instead
+    of fork + closing every open descriptor.
+    """
+    with tempfile.TemporaryFile() as err:
+        result = subprocess.run(cmd, executable=FFMPEG_BIN, stdout=subprocess.DEVNULL,
+                                stderr=err, timeout=timeout, close_fds=False,
+                                stdin=subprocess.DEVNULL)
+        result.stderr = _read_stderr_tail(err)
+    return result
+
+def _probe_ffmpeg():
+    """Check whether the ffmpeg binary can be executed."""
     try:
-        # Use ffprobe to get file information
-        cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', file_path]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        if result.returncode != 0:
-            return False, "Invalid video file format"
-        
-        probe_data = json.loads(result.stdout)
-        
-        # Check for video streams
-        video_streams = [stream for stream in probe_data.get('streams', []) if stream.get('codec_type') == 'video']
-        if not video_streams:
-            return False, "No video stream found in file"
-        
-        # Check if it's a webm container
-        format_name = probe_data.get('format', {}).get('format_name', '')
-        if 'webm' not in format_name.lower() and 'matroska' not in format_name.lower():
-            return False, "File is not a valid WebM format"
-        
-        return True, "Valid WebM file"
-    except subprocess.TimeoutExpired:
-        logger.error("File validation timed out")
-        return False, "File validation timed out"
-    except Exception as e:
-        logger.error(f"Error validating file: {str(e)}")
-        return False, f"Error validating file: {str(e)}"
+        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, timeout=10)
+        return result.returncode == 0
+    except Exception:
+        return False
 
-def convert_webm_to_mp4(input_path, output_path):
-    """Convert webm file to mp4 using ffmpeg."""
+def _ffmpeg_fingerprint():
+    """Return (path, mtime) of the ffmpeg binary on PATH, or None if missing."""
+    path = shutil.which('ffmpeg')
     try:
-        logger.info(f"Starting conversion: {input_path} -> {output_path}")
-        
-        # Use ffmpeg command directly
-        cmd = [
-            'ffmpeg',
+        return (path, os.stat(path).st_mtime) if path else None
+    except OSError:
+        return None
+
+# Probed once at startup instead of forking ffmpeg on every /api/status call
+FFMPEG_AVAILABLE = _probe_ffmpeg()
+_ffmpeg_probe_key = _ffmpeg_fingerprint()
+_ffmpeg_probe_checked = time.monotonic()
+FFMPEG_RECHECK_INTERVAL = 60  # seconds between binary fingerprint checks
+
+def ffmpeg_available():
+    """Return the cached ffmpeg availability, re-probing only if the binary changed."""
+    global FFMPEG_AVAILABLE, _ffmpeg_probe_key, _ffmpeg_probe_checked
+    now = time.monotonic()
+    if now - _ffmpeg_probe_checked >= FFMPEG_RECHECK_INTERVAL:
+        _ffmpeg_probe_checked = now
+        key = _ffmpeg_fingerprint()
+        if key != _ffmpeg_probe_key:
+            _ffmpeg_probe_key = key
+            FFMPEG_AVAILABLE = key is not None and _probe_ffmpeg()
+    return FFMPEG_AVAILABLE
+
+def _encoder_usable(encoder):
+    """Run a tiny test encode to confirm a hardware encoder has a usable device."""
+    cmd = ['ffmpeg', '-hide_banner', '-v', 'error']
+    vf = []
+    if encoder == 'h264_vaapi':
+        cmd += ['-vaapi_device', VAAPI_DEVICE]
+        vf = ['-vf', 'format=nv12,hwupload']
+    cmd += ['-f', 'lavfi', '-i', 'color=c=black:s=256x256:d=0.1', *vf, '-c:v', encoder, '-f', 'null', '-']
+    try:
+        return subprocess.run(cmd, capture_output=True, timeout=15).returncode == 0
+    except Exception:
+        return False
+
+def _detect_encoder():
+    """Pick the best H.264 encoder reported by `ffmpeg -encoders`."""
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True, timeout=10)
+        if result.returncode == 0:
+            available = {line.split()[1] for line in result.stdout.splitlines() if len(line.split()) > 1}
+            for encoder in HW_ENCODERS:
+                if encoder in available and _encoder_usable(encoder):
+                    logger.info("Using hardware video encoder: %s", encoder)
+                    return encoder
+    except Exception as e:
+        logger.warning("Could not detect ffmpeg encoders: %s", e)
+    return 'libx264'
+
+# Detected once at startup and reported by /api/status
+VIDEO_ENCODER = _detect_encoder()
+
+def _build_convert_cmd(input_path, output_path, encoder, fragmented=False):
+    """Build the ffmpeg command for a webm -> mp4 conversion with the given encoder.
+
+    `fragmented` writes fragmented MP4, which is playable while it is still
+    being written; otherwise the moov atom is moved to the front at the end.
+    """
+    # -nostats drops the per-frame progress lines nobody reads
+    thread_args = ['-nostats', '-threads', FFMPEG_THREADS, '-filter_threads', FFMPEG_THREADS]
+    if fragmented:
+        mov_args = ['-movflags', '+frag_keyframe+empty_moov+default_base_moof', '-frag_duration', '1000000']
+    else:
+        mov_args = ['-movflags', '+faststart']
+    if encoder == 'copy':
+        # Container-only remux: keep the original video stream, transcode audio to AAC
+        return [
+            'ffmpeg', *thread_args,
             '-i', input_path,
-            '-c:v', 'libx264',  # H.264 video codec
-            '-c:a', 'aac',      # AAC audio codec
-            '-crf', '23',       # Constant Rate Factor for quality
-            '-preset', 'medium', # Encoding speed preset
-            '-y',               # Overwrite output file
-            output_path
+            '-c:v', 'copy',
+            '-c:a', 'aac',
+            *mov_args,
+            '-y', output_path
         ]
-        
+    if encoder == 'h264_nvenc':
+        return [
+            'ffmpeg', *thread_args,
+            '-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda',
+            '-i', input_path,
+            '-c:v', 'h264_nvenc', '-preset', 'p4', '-rc', 'vbr', '-cq', '23', '-b:v', '0',
+            '-c:a', 'aac',
+            *mov_args,
+            '-y', output_path
+        ]
+    if encoder == 'h264_vaapi':
+        return [
+            'ffmpeg', *thread_args,
+            '-hwaccel', 'vaapi', '-vaapi_device', VAAPI_DEVICE,
+            '-i', input_path,
+            '-vf', 'format=nv12|vaapi,hwupload',
+            '-c:v', 'h264_vaapi', '-qp', '23',
+            '-c:a', 'aac',
+            *mov_args,
+            '-y', output_path
+        ]
+    if encoder == 'h264_qsv':
+        return [
+            'ffmpeg', *thread_args,
+            '-hwaccel', 'qsv',
+            '-i', input_path,
+            '-c:v', 'h264_qsv', '-global_quality', '23',
+            '-c:a', 'aac',
+            *mov_args,
+            '-y', output_path
+        ]
+    if encoder == 'h264_videotoolbox':
+        return [
+            'ffmpeg', *thread_args,
+            '-hwaccel', 'videotoolbox',
+            '-i', input_path,
+            '-c:v', 'h264_videotoolbox', '-b:v', '6M',
+            '-c:a', 'aac',
+            *mov_args,
+            '-y', output_path
+        ]
+    return [
+        'ffmpeg', *thread_args,
+        '-i', input_path,
+        '-c:v', 'libx264',  # H.264 video codec
+        '-c:a', 'aac',      # AAC audio codec
+        '-crf', '23',       # Constant Rate Factor for quality
+        '-preset', X264_PRESET, # Encoding speed preset
+        '-tune', 'zerolatency', # No lookahead buffering
+        '-bf', '0',         # No B-frames
+        '-g', '60',         # Keyframe interval
+        *mov_args,          # moov atom up front for progressive playback
+        '-y',               # Overwrite output file
+        output_path
+    ]
+
+SLIDESHOW_VF = 'scale=1920:1080:force_original_aspect_ratio=decrease,pad=1920:1080:(ow-iw)/2:(oh-ih)/2,setsar=1'
+
+def _encode_args(encoder, vf):
+    """Video filter and H.264 encoder arguments for a software-filtered encode with `encoder`."""
+    if encoder == 'h264_vaapi':
+        return ['-vaapi_device', VAAPI_DEVICE, '-vf', vf + ',format=nv12,hwupload',
+                '-c:v', 'h264_vaapi', '-qp', '23', '-threads', FFMPEG_THREADS]
+    if encoder == 'h264_nvenc':
+        quality = ['-preset', 'p4', '-rc', 'vbr', '-cq', '23', '-b:v', '0']
+    elif encoder == 'h264_qsv':
+        quality = ['-global_quality', '23']
+    elif encoder == 'h264_videotoolbox':
+        quality = ['-b:v', '6M']
+    else:
+        quality = []
+    return ['-vf', vf, '-c:v', encoder, *quality, '-pix_fmt', 'yuv420p', '-threads', FFMPEG_THREADS]
+
+def _slideshow_video_args(encoder):
+    """Video filter and encoder arguments for the 1080p CSV slideshow."""
+    # fps comes after scale/pad so each image is scaled once, then duplicated
+    return _encode_args(encoder, SLIDESHOW_VF + ',fps=30')
+
+def _discard_attempt(output_path):
+    """Unlink a failed attempt's output so the retry writes a new file.
+
+    ffmpeg -y would truncate and reuse the same inode, splicing the retry
+    onto bytes a download following the file has already sent; with a new
+    inode _follow_conversion_output can tell the file was replaced.
+    """
+    try:
+        os.remove(output_path)
+    except FileNotFoundError:
+        pass
+
+def convert_webm_to_mp4(input_path, output_path, remux=False, fragmented=False):
+    """Convert webm file to mp4 using ffmpeg.
+
+    With `remux` (implied for H.264 sources) the video stream is copied
+    into the MP4 container as-is and only the audio is transcoded; if the
+    codec can't be stored in MP4 the file is re-encoded instead.
+    `fragmented` output can be downloaded while the conversion runs.
+    """
+    try:
+        logger.info("Starting conversion: %s -> %s", input_path, output_path)
+
+        if not remux:
+            with open(input_path, 'rb') as f:
+                remux = has_h264_video(f.read(WEBM_SNIFF_SIZE))
+
+        if remux:
+            cmd = _build_convert_cmd(input_path, output_path, 'copy', fragmented)
+            result = run_ffmpeg(cmd, timeout=600)
+            if result.returncode == 0:
+                logger.info("Remux completed successfully: %s", output_path)
+                return True, "Conversion successful"
+            logger.warning("Remux failed, re-encoding instead: %s", result.stderr)
+            _discard_attempt(output_path)
+
+        cmd = _build_convert_cmd(input_path, output_path, VIDEO_ENCODER, fragmented)
+
         # Run the conversion
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)  # 10 minute timeout
-        
+        result = run_ffmpeg(cmd, timeout=600)  # 10 minute timeout
+
+        # The encoder may be compiled in without a usable device; retry on the CPU
+        if result.returncode != 0 and VIDEO_ENCODER != 'libx264':
+            logger.warning("%s conversion failed, falling back to libx264: %s", VIDEO_ENCODER, result.stderr)
+            _discard_attempt(output_path)
+            cmd = _build_convert_cmd(input_path, output_path, 'libx264', fragmented)
+            result = run_ffmpeg(cmd, timeout=600)
+
         if result.returncode != 0:
             error_msg = f"FFmpeg conversion failed: {result.stderr}"
             logger.error(error_msg)
             return False, error_msg
         
-        logger.info(f"Conversion completed successfully: {output_path}")
+        logger.info("Conversion completed successfully: %s", output_path)
         return True, "Conversion successful"
         
     except subprocess.TimeoutExpired:
@@ -212,28 +537,122 @@ def convert_webm_to_mp4(input_path, output_path):
         logger.error(error_msg)
         return False, error_msg
 
-def cleanup_file(file_path):
-    """Safely remove a file."""
+def convert_stream_to_mp4(stream, output_path, head=b'', remux=False):
+    """Convert a webm byte stream to mp4 by piping it into ffmpeg's stdin.
+
+    `head` holds any bytes already read from `stream` (e.g. for a magic
+    byte check) and is written ahead of the rest of the stream. A piped
+    input can't be replayed, so a failed `remux` is not retried as a
+    re-encode.
+    """
     try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            logger.info(f"Cleaned up file: {file_path}")
+        logger.info("Starting piped conversion -> %s", output_path)
+        cmd = _build_convert_cmd('pipe:0', output_path, 'copy' if remux else VIDEO_ENCODER)
+
+        # stderr goes to a temp file so a chatty ffmpeg can't fill the pipe and stall stdin
+        with tempfile.TemporaryFile() as err:
+            proc = subprocess.Popen(cmd, executable=FFMPEG_BIN, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                    stderr=err, close_fds=False)
+            try:
+                if head:
+                    proc.stdin.write(head)
+                shutil.copyfileobj(stream, proc.stdin, length=UPLOAD_CHUNK_SIZE)
+            except BrokenPipeError:
+                # ffmpeg exited early; its return code and stderr explain why
+                pass
+            except BaseException:
+                # The upload broke off (client disconnect, body over the size limit, ...):
+                # reap ffmpeg and drop the partial output, then let the caller see the error
+                proc.kill()
+                proc.wait()
+                _discard_attempt(output_path)
+                raise
+            finally:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+            try:
+                returncode = proc.wait(timeout=600)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+                raise
+            stderr = _read_stderr_tail(err)
+
+        if returncode != 0:
+            error_msg = f"FFmpeg conversion failed: {stderr}"
+            logger.error(error_msg)
+            return False, error_msg
+
+        logger.info("Conversion completed successfully: %s", output_path)
+        return True, "Conversion successful"
+
+    except subprocess.TimeoutExpired:
+        error_msg = "Conversion timed out - file may be too large"
+        logger.error(error_msg)
+        return False, error_msg
+    except HTTPException:
+        # e.g. 413 from reading a body over MAX_CONTENT_LENGTH; the route maps it to its status
+        raise
     except Exception as e:
-        logger.error(f"Error cleaning up file {file_path}: {str(e)}")
+        error_msg = f"Conversion error: {str(e)}"
+        logger.error(error_msg)
+        return False, error_msg
+
+# Files and scratch directories are removed on a background thread so
+# handlers never wait on unlink()
+cleanup_queue = queue.SimpleQueue()
+
+def _process_cleanup_queue():
+    """Worker function that deletes files handed to cleanup_file."""
+    while True:
+        file_path = cleanup_queue.get()
+        try:
+            if os.path.isdir(file_path):
+                shutil.rmtree(file_path)
+            else:
+                os.remove(file_path)
+            logger.info("Cleaned up file: %s", file_path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error("Error cleaning up file %s: %s", file_path, e)
+
+cleanup_worker = threading.Thread(target=_process_cleanup_queue, daemon=True)
+cleanup_worker.start()
+
+def cleanup_file(file_path):
+    """Schedule a file (or a whole scratch directory) for removal on the cleanup thread."""
+    cleanup_queue.put(file_path)
+
+DATA_URL_RE = re.compile(r'data:[^;]+;base64,')
+# Multiple of 4 so every chunk decodes on its own
+DATA_URL_CHUNK_SIZE = 1024 * 1024
 
 def _decode_data_url_to_file(data_url: str, out_path: str) -> bool:
-    """Decode a data: URL (base64) to a file on disk."""
+    """Decode a data: URL (base64) to a file on disk.
+
+    The payload is decoded in chunks straight from the URL string, so at
+    most one chunk of decoded bytes is held in memory besides the URL.
+    """
     try:
-        import re, base64
-        m = re.match(r"^data:([^;]+);base64,(.*)$", data_url)
+        m = DATA_URL_RE.match(data_url)
         if not m:
             return False
-        b64 = m.group(2)
+        start = m.end()
         with open(out_path, 'wb') as f:
-            f.write(base64.b64decode(b64))
+            try:
+                for pos in range(start, len(data_url), DATA_URL_CHUNK_SIZE):
+                    f.write(binascii.a2b_base64(data_url[pos:pos + DATA_URL_CHUNK_SIZE]))
+            except binascii.Error:
+                # Whitespace in the payload breaks the chunk alignment; decode it in one go
+                f.seek(0)
+                f.truncate()
+                f.write(base64.b64decode(data_url[start:]))
         return True
     except Exception as e:
-        logger.error(f"Failed to decode data URL: {e}")
+        logger.error("Failed to decode data URL: %s", e)
         return False
 
 def _download_or_decode_image_to_file(src: str, out_path: str) -> bool:
@@ -251,14 +670,23 @@ def _download_or_decode_image_to_file(src: str, out_path: str) -> bool:
             return True
         return False
     except Exception as e:
-        logger.error(f"Failed to obtain image: {e}")
+        logger.error("Failed to obtain image: %s", e)
         return False
 
 def _probe_duration_seconds(media_path: str) -> float:
+    # The render pipeline normally hands over the WAV it just wrote; its header has the length
+    if media_path.endswith('.wav'):
+        try:
+            with wave.open(media_path, 'rb') as w:
+                return w.getnframes() / w.getframerate()
+        except (wave.Error, EOFError, OSError, ZeroDivisionError):
+            pass
     try:
-        cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', media_path]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        data = json.loads(result.stdout or '{}')
+        # Only ask for durations so the JSON stays a few hundred bytes
+        cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json',
+               '-show_entries', 'format=duration:stream=duration', media_path]
+        result = subprocess.run(cmd, capture_output=True, timeout=30)
+        data = json.loads(result.stdout or b'{}')
         dur = float(data.get('format', {}).get('duration', '0') or 0)
         if dur <= 0:
             # Try stream duration
@@ -272,33 +700,38 @@ def _probe_duration_seconds(media_path: str) -> float:
 def _build_srt_from_scenes(scenes, durations, out_path: str):
     try:
         def fmt(t):
-            h = int(t // 3600); m = int((t % 3600) // 60); s = int(t % 60); ms = int((t % 1) * 1000)
+            # Whole milliseconds, so float drift like 2.9999998 doesn't print as 00:00:02,999
+            s, ms = divmod(round(t * 1000), 1000)
+            m, s = divmod(s, 60)
+            h, m = divmod(m, 60)
             return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
         t = 0.0
+        parts = []
+        idx = 1
+        for i, sc in enumerate(scenes):
+            text = (sc.get('text') or '').strip()
+            d = durations[i]
+            if text:
+                text = text.replace('\n', ' ')
+                parts.append(f"{idx}\n{fmt(t)} --> {fmt(t + d)}\n{text}\n\n")
+                idx += 1
+            t += d
         with open(out_path, 'w', encoding='utf-8') as f:
-            idx = 1
-            for i, sc in enumerate(scenes):
-                text = (sc.get('text') or '').strip()
-                if not text:
-                    d = durations[i]
-                    t += d
-                    continue
-                d = durations[i]
-                start = t; end = t + d
-                f.write(f"{idx}\n")
-                f.write(f"{fmt(start)} --> {fmt(end)}\n")
-                f.write(text.replace('\n', ' ') + "\n\n")
-                t = end; idx += 1
+            f.write(''.join(parts))
     except Exception as e:
-        logger.warning(f"Failed to create SRT: {e}")
+        logger.warning("Failed to create SRT: %s", e)
+
+# One keep-alive session for all outbound HTTP so TCP/TLS connections are reused;
+# idempotent requests are retried with a short backoff
+http_session = requests.Session()
+http_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64,
+                           max_retries=Retry(total=3, backoff_factor=0.2))
+http_session.mount('https://', http_adapter)
+http_session.mount('http://', http_adapter)
 
 def synthesize_speech(text, output_path, language_code="en-US", voice_name="en-US-Standard-C", api_key=None):
     """Synthesize speech from text using Gemini TTS."""
     try:
-        import os
-        import json
-        import requests
-        
         # Use provided API key or get from environment variables
         if not api_key:
             api_key = os.environ.get("GEMINI_API_KEY")
@@ -308,7 +741,10 @@ def synthesize_speech(text, output_path, language_code="en-US", voice_name="en-U
         
         # Set up the API endpoint
         model = "gemini-2.0-flash"
-        api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent?key={api_key}"
+        if csv_to_video_ffmpeg.copy_cached_speech(model, voice_name, text, output_path):
+            return True, "Speech loaded from cache"
+        
+        api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent?alt=sse&key={api_key}"
         
         # Prepare the request payload
         payload = {
@@ -335,10 +771,10 @@ def synthesize_speech(text, output_path, language_code="en-US", voice_name="en-U
             "Content-Type": "application/json"
         }
         
-        response = requests.post(api_url, headers=headers, data=json.dumps(payload))
+        response = http_session.post(api_url, headers=headers, data=json.dumps(payload, separators=(',', ':')), stream=True)
         
         if response.status_code != 200:
-            logger.error(f"Gemini TTS API error: {response.status_code} - {response.text}")
+            logger.error("Gemini TTS API error: %s - %s", response.status_code, response.text)
             # Parse error message if possible
             try:
                 error_data = response.json()
@@ -347,196 +783,175 @@ def synthesize_speech(text, output_path, language_code="en-US", voice_name="en-U
             except:
                 return False, f"Gemini TTS API error: {response.status_code}"
         
-        # Parse the response
-        response_data = response.json()
-        
-        # Extract audio data from the response
-        audio_data = None
-        for item in response_data:
-            if "candidates" in item and len(item["candidates"]) > 0:
-                candidate = item["candidates"][0]
-                if "content" in candidate and "parts" in candidate["content"]:
-                    for part in candidate["content"]["parts"]:
-                        if "inlineData" in part and part["inlineData"]["mimeType"].startswith("audio/"):
-                            audio_data = part["inlineData"]["data"]
-                            break
-            if audio_data:
-                break
-        
-        if not audio_data:
+        # Audio is decoded event by event, so neither the whole response body nor
+        # the whole base64 payload is held in memory
+        mime_type = csv_to_video_ffmpeg.write_streamed_audio(response, output_path)
+        if not mime_type:
             logger.error("No audio data found in Gemini TTS response")
             return False, "No audio data found in response"
-        
-        # Decode base64 audio data and save to file
-        import base64
-        audio_bytes = base64.b64decode(audio_data)
-        
-        with open(output_path, "wb") as out:
-            out.write(audio_bytes)
-            logger.info(f"Audio content written to file: {output_path}")
+        logger.info("Audio content written to file: %s", output_path)
+        csv_to_video_ffmpeg.cache_speech(model, voice_name, text, output_path, mime_type)
             
         return True, "Speech synthesized successfully"
         
     except Exception as e:
-        logger.error(f"Error synthesizing speech with Gemini TTS: {str(e)}")
+        logger.error("Error synthesizing speech with Gemini TTS: %s", e)
         return False, f"Error synthesizing speech: {str(e)}"
 
 def download_image(url, save_path):
     """Download an image from a URL and save it to the specified path."""
     try:
-        response = requests.get(url, timeout=30)
+        response = http_session.get(url, timeout=30, stream=True)
         response.raise_for_status()
         
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
+        # Let urllib3 undo any gzip/deflate transfer encoding while copying
+        response.raw.decode_content = True
+        with response, open(save_path, 'wb') as f:
+            shutil.copyfileobj(response.raw, f)
             
         return True, "Image downloaded successfully"
     except Exception as e:
-        logger.error(f"Error downloading image from {url}: {str(e)}")
+        logger.error("Error downloading image from %s: %s", url, e)
         return False, f"Error downloading image: {str(e)}"
 
-def create_video_from_images(image_paths, output_path, duration_per_image=3, narration_texts=None, language_code="en-US", voice_name="en-US-Standard-C", api_key=None):
-    """Create a video slideshow from a list of image paths using ffmpeg with optional voice narration."""
+# Leading bytes of the image formats we accept from product CSVs
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF8', 'gif'),
+)
+
+# File extension for each format, so ffmpeg's image2 demuxer picks the right decoder
+IMAGE_EXTENSIONS = {'jpeg': 'jpg', 'png': 'png', 'gif': 'gif', 'webp': 'webp'}
+
+def image_format(data):
+    """Identify an encoded image by its signature, or None if unrecognised."""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    for signature, name in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return name
+    return None
+
+# Delimiters the CSV sniffer may pick from
+CSV_DELIMITERS = ',;\t|'
+# file_ids are uuid4 values issued as 32 hex digits by new_file_id(); the dashed
+# form is still accepted so links to older render outputs keep working
+FILE_ID_RE = re.compile(r'[0-9a-f]{8}(-?)[0-9a-f]{4}\1[0-9a-f]{4}\1[0-9a-f]{4}\1[0-9a-f]{12}\Z')
+
+def new_file_id():
+    """Return a fresh file ID for uploads, renders and CSV batches."""
+    return uuid.uuid4().hex
+
+# An image cell holds an http(s) URL that isn't a product video
+IMAGE_URL_RE = re.compile(r'http.*(?<!(?i:\.mp4))\Z', re.DOTALL)
+
+# Separate pools for image downloads and Gemini TTS calls, so narration never
+# queues behind a large batch of images and concurrent TTS requests stay capped
+IMAGE_DOWNLOAD_WORKERS = 16
+TTS_WORKERS = 8
+io_pool = ThreadPoolExecutor(max_workers=IMAGE_DOWNLOAD_WORKERS, thread_name_prefix='io')
+tts_pool = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix='tts')
+
+def fetch_image(url, save_path):
+    """Stream an image from a URL to save_path and return its format, or None on failure."""
+    success, message = download_image(url, save_path)
+    fmt = None
+    if success:
+        with open(save_path, 'rb') as f:
+            fmt = image_format(f.read(12))
+        if fmt is None:
+            logger.warning("Skipping image from %s: not a JPEG, PNG, GIF or WebP file", url)
+    if fmt is None:
+        cleanup_file(save_path)
+    return fmt
+
+def synthesize_narration_clip(text, audio_path, language_code="en-US", voice_name="en-US-Standard-C", api_key=None):
+    """Synthesize one narration line, returning the audio path or None on failure."""
+    success, message = synthesize_speech(text, audio_path, language_code, voice_name, api_key)
+    if not success:
+        logger.warning("Failed to synthesize speech for %s: %s", audio_path, message)
+        return None
+    return audio_path
+
+def submit_narration(narration_texts, language_code="en-US", voice_name="en-US-Standard-C", api_key=None):
+    """Start synthesizing each non-empty narration line on the TTS pool and return the futures."""
+    job_id = secrets.token_hex(8)
+    return [
+        tts_pool.submit(synthesize_narration_clip, text,
+                       os.path.join(UPLOAD_FOLDER, f"narration_{job_id}_{i}.mp3"),
+                       language_code, voice_name, api_key)
+        for i, text in enumerate(narration_texts) if text.strip()
+    ]
+
+def _run_encode(cmd, encoder_args, timeout=600):
+    """Run an encode built with encoder_args(VIDEO_ENCODER), retrying with libx264 if the hardware encoder fails."""
+    result = run_ffmpeg(cmd, timeout)
+    if result.returncode != 0 and VIDEO_ENCODER != 'libx264':
+        logger.warning("%s encode failed, falling back to libx264: %s", VIDEO_ENCODER, result.stderr)
+        hw_args = encoder_args(VIDEO_ENCODER)
+        start = cmd.index(hw_args[0])
+        cmd = cmd[:start] + encoder_args('libx264') + cmd[start + len(hw_args):]
+        result = run_ffmpeg(cmd, timeout)
+    return result
+
+def create_video_from_images(images, output_path, duration_per_image=3, narration_texts=None, language_code="en-US", voice_name="en-US-Standard-C", api_key=None, audio_files=None):
+    """Create a video slideshow from image files using ffmpeg with optional voice narration.
+
+    `images` are paths named 0000.ext, 0001.ext, ... in one scratch directory,
+    all in the same format (see `fetch_image`), which ffmpeg's image2 demuxer
+    reads in sequence. The directory is removed once the video is encoded.
+    Narration that was already synthesized can be passed as `audio_files`
+    (in playback order); those files are removed once used.
+    """
+    image_dir = os.path.dirname(images[0])
     try:
-        temp_dir = os.path.dirname(image_paths[0]) if image_paths else UPLOAD_FOLDER
-        
-        # Create a temporary text file with the list of images
-        temp_file = os.path.join(temp_dir, f"temp_{uuid.uuid4()}.txt")
-        
-        with open(temp_file, 'w') as f:
-            for image_path in image_paths:
-                # Each image will be shown for duration_per_image seconds
-                f.write(f"file '{image_path}'\nduration {duration_per_image}\n")
-            # Add the last image again to ensure it's shown for the full duration
-            f.write(f"file '{image_paths[-1]}'\n")
+        # Each image is one input frame shown for duration_per_image seconds
+        pattern = os.path.join(image_dir, '%04d' + os.path.splitext(images[0])[1])
+        image_input = ['-f', 'image2', '-framerate', f"1/{duration_per_image}", '-i', pattern]
+        video_args = _slideshow_video_args(VIDEO_ENCODER)
         
-        # If narration texts are provided, create audio files and combine with video
-        if narration_texts and len(narration_texts) > 0:
+        if audio_files is None and narration_texts:
             # Create audio files for each narration text
-            audio_files = []
-            for i, text in enumerate(narration_texts):
-                if text.strip():
-                    audio_path = os.path.join(temp_dir, f"narration_{i}.mp3")
-                    success, message = synthesize_speech(text, audio_path, language_code, voice_name, api_key)
-                    if success:
-                        audio_files.append(audio_path)
-                    else:
-                        logger.warning(f"Failed to synthesize speech for text {i}: {message}")
-            
-            # If we have audio files, create a combined audio track
+            futures = submit_narration(narration_texts, language_code, voice_name, api_key)
+            audio_files = [path for path in (f.result() for f in futures) if path]
+        audio_files = audio_files or []
+        
+        try:
+            cmd = ['ffmpeg', '-nostats', *image_input]
             if audio_files:
-                # Create a temporary file list for audio concatenation
-                audio_list_file = os.path.join(temp_dir, f"audio_list_{uuid.uuid4()}.txt")
-                with open(audio_list_file, 'w') as f:
-                    for audio_file in audio_files:
-                        f.write(f"file '{audio_file}'\n")
-                
-                # Concatenate audio files
-                combined_audio_path = os.path.join(temp_dir, f"combined_narration_{uuid.uuid4()}.mp3")
-                cmd = [
-                    'ffmpeg',
-                    '-f', 'concat',
-                    '-safe', '0',
-                    '-i', audio_list_file,
-                    '-c', 'copy',
-                    '-y',
-                    combined_audio_path
-                ]
-                
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-                
-                # Clean up audio list file
-                if os.path.exists(audio_list_file):
-                    os.remove(audio_list_file)
-                
-                # Clean up individual audio files
+                # Concatenate the narration clips in the same ffmpeg run as the video
                 for audio_file in audio_files:
-                    if os.path.exists(audio_file):
-                        os.remove(audio_file)
-                
-                if result.returncode == 0 and os.path.exists(combined_audio_path):
-                    # Use ffmpeg to create the video with audio
-                    cmd = [
-                        'ffmpeg',
-                        '-f', 'concat',
-                        '-safe', '0',
-                        '-i', temp_file,
-                        '-i', combined_audio_path,
-                        '-vf', 'scale=1920:1080:force_original_aspect_ratio=decrease,pad=1920:1080:(ow-iw)/2:(oh-ih)/2,setsar=1',
-                        '-c:v', 'libx264',
-                        '-c:a', 'aac',
-                        '-strict', 'experimental',
-                        '-r', '30',
-                        '-pix_fmt', 'yuv420p',
-                        '-y',
-                        output_path
-                    ]
-                    
-                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-                    
-                    # Clean up combined audio file
-                    if os.path.exists(combined_audio_path):
-                        os.remove(combined_audio_path)
-                else:
-                    # If audio creation failed, create video without audio
-                    logger.warning("Failed to create combined audio, creating video without audio")
-                    cmd = [
-                        'ffmpeg',
-                        '-f', 'concat',
-                        '-safe', '0',
-                        '-i', temp_file,
-                        '-vf', 'scale=1920:1080:force_original_aspect_ratio=decrease,pad=1920:1080:(ow-iw)/2:(oh-ih)/2,setsar=1',
-                        '-c:v', 'libx264',
-                        '-r', '30',
-                        '-pix_fmt', 'yuv420p',
-                        '-y',
-                        output_path
-                    ]
-                    
-                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-            else:
-                # No audio files created, create video without audio
-                cmd = [
-                    'ffmpeg',
-                    '-f', 'concat',
-                    '-safe', '0',
-                    '-i', temp_file,
-                    '-vf', 'scale=1920:1080:force_original_aspect_ratio=decrease,pad=1920:1080:(ow-iw)/2:(oh-ih)/2,setsar=1',
-                    '-c:v', 'libx264',
-                    '-r', '30',
-                    '-pix_fmt', 'yuv420p',
+                    cmd += ['-i', audio_file]
+                labels = ''.join(f"[{i}:a]" for i in range(1, len(audio_files) + 1))
+                cmd += [
+                    *video_args,
+                    '-filter_complex', f"{labels}concat=n={len(audio_files)}:v=0:a=1[aout]",
+                    '-map', '0:v', '-map', '[aout]',
+                    '-c:a', 'aac',
                     '-y',
                     output_path
                 ]
-                
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-        else:
-            # No narration texts, create video without audio
-            cmd = [
-                'ffmpeg',
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', temp_file,
-                '-vf', 'scale=1920:1080:force_original_aspect_ratio=decrease,pad=1920:1080:(ow-iw)/2:(oh-ih)/2,setsar=1',
-                '-c:v', 'libx264',
-                '-r', '30',
-                '-pix_fmt', 'yuv420p',
-                '-y',
-                output_path
-            ]
+                result = _run_encode(cmd, _slideshow_video_args)
+                if result.returncode != 0:
+                    # If the narration could not be combined, create video without audio
+                    logger.warning("Failed to add narration, creating video without audio: %s", result.stderr)
             
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-        
-        # Clean up the temporary file
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+            if not audio_files or result.returncode != 0:
+                cmd = ['ffmpeg', '-nostats', *image_input, *video_args, '-y', output_path]
+                result = _run_encode(cmd, _slideshow_video_args)
+        finally:
+            # Clean up individual audio files and the downloaded images
+            for audio_file in audio_files:
+                cleanup_file(audio_file)
+            cleanup_file(image_dir)
         
         if result.returncode != 0:
             error_msg = f"FFmpeg video creation failed: {result.stderr}"
             logger.error(error_msg)
             return False, error_msg
         
-        logger.info(f"Video created successfully: {output_path}")
+        logger.info("Video created successfully: %s", output_path)
         return True, "Video created successfully"
         
     except subprocess.TimeoutExpired:
@@ -549,19 +964,28 @@ def create_video_from_images(image_paths, output_path, duration_per_image=3, nar
         return False, error_msg
 
 def process_csv_and_create_video(csv_path, duration_per_image=3, language_code="en-US", voice_name="en-US-Standard-C", api_key=None):
-    """Process a CSV file and create separate videos for each product from the images."""
+    """Process a CSV file and create separate videos for each product from the images.
+
+    Products are encoded on conversion_pool, so this must not itself run on it.
+    """
     try:
-        temp_image_dir = os.path.join(UPLOAD_FOLDER, f"temp_images_{uuid.uuid4()}")
-        os.makedirs(temp_image_dir, exist_ok=True)
-        
         # Read the CSV file
         with open(csv_path, 'r', encoding='utf-8') as f:
             # Try to detect the dialect
             sample = f.read(1024)
             f.seek(0)
             sniffer = csv.Sniffer()
-            dialect = sniffer.sniff(sample)
-            has_header = sniffer.has_header(sample)
+            try:
+                # Only consider real delimiters; a failed guess falls back to plain comma CSV
+                dialect = sniffer.sniff(sample, delimiters=CSV_DELIMITERS)
+            except csv.Error:
+                dialect = csv.excel
+            try:
+                # has_header() sniffs again without the delimiter restriction, so it fails on the same samples
+                has_header = sniffer.has_header(sample)
+            except csv.Error:
+                # Product CSVs always start with a header row
+                has_header = True
             
             reader = csv.reader(f, dialect)
             
@@ -601,94 +1025,119 @@ def process_csv_and_create_video(csv_path, duration_per_image=3, language_code="
             
             # Process each row (product)
             product_videos = []
+            encodes = []
             for row_num, row in enumerate(reader):
-                image_paths = []
-                # Process image columns for this row
-                for col_index in image_columns:
-                    if col_index < len(row):
-                        image_url = row[col_index].strip()
-                        # Check if it looks like a URL
-                        if image_url.startswith('http') and not image_url.lower().endswith('.mp4'):
-                            # Download the image
-                            image_filename = f"image_{row_num}_{col_index}.jpg"
-                            image_path = os.path.join(temp_image_dir, image_filename)
-                            
-                            success, message = download_image(image_url, image_path)
-                            if success and os.path.exists(image_path):
-                                image_paths.append(image_path)
+                # Collect image URLs for this row
+                cells = [row[col_index].strip() for col_index in image_columns if col_index < len(row)]
+                image_urls = [cell for cell in cells if IMAGE_URL_RE.match(cell)]
+                
+                if not image_urls:
+                    continue
+                
+                # Extract product information for narration
+                narration_texts = []
+                
+                # Get product title
+                product_title = ""
+                if product_title_col is not None and product_title_col < len(row):
+                    product_title = row[product_title_col].strip()
+                
+                # Get product description
+                product_description = ""
+                if product_description_col is not None and product_description_col < len(row):
+                    product_description = row[product_description_col].strip()
+                
+                # Get brand
+                brand = ""
+                if brand_col is not None and brand_col < len(row):
+                    brand = row[brand_col].strip()
+                
+                # Get price
+                price = ""
+                if price_col is not None and price_col < len(row):
+                    price = row[price_col].strip()
+                
+                # Create narration text
+                if product_title:
+                    narration_texts.append(f"Check out this amazing product: {product_title}")
+                
+                if brand:
+                    narration_texts.append(f"Brand: {brand}")
+                
+                if product_description:
+                    # Split long descriptions into multiple sentences
+                    sentences = product_description.split('.')
+                    for sentence in sentences:
+                        sentence = sentence.strip()
+                        if sentence:
+                            narration_texts.append(sentence)
+                
+                if price:
+                    narration_texts.append(f"Price: {price}")
+                
+                # Add a call to action
+                narration_texts.append("Don't miss out on this great deal!")
+                
+                # Stream the images to disk and synthesize the narration side by side
+                image_dir = tempfile.mkdtemp(prefix=f"product_{row_num}_", dir=UPLOAD_FOLDER)
+                download_paths = [os.path.join(image_dir, f"{i}.download") for i in range(len(image_urls))]
+                image_futures = [io_pool.submit(fetch_image, url, path) for url, path in zip(image_urls, download_paths)]
+                tts_futures = submit_narration(narration_texts, language_code, voice_name, api_key)
+                wait(image_futures + tts_futures)
+                audio_files = [path for path in (f.result() for f in tts_futures) if path]
+                
+                images = []
+                first_format = None
+                for url, path, future in zip(image_urls, download_paths, image_futures):
+                    fmt = future.result()
+                    if fmt is None:
+                        # fetch_image already logged why
+                        continue
+                    # The image2 demuxer decodes one format per stream
+                    first_format = first_format or fmt
+                    if fmt != first_format:
+                        logger.warning("Skipping %s image %s for product %s; expected %s", fmt, url, row_num, first_format)
+                        cleanup_file(path)
+                        continue
+                    # Number the kept images contiguously for the image2 sequence pattern
+                    image_path = os.path.join(image_dir, f"{len(images):04d}.{IMAGE_EXTENSIONS[fmt]}")
+                    os.replace(path, image_path)
+                    images.append(image_path)
                 
                 # If we have images for this product, create a video
-                if image_paths:
-                    # Extract product information for narration
-                    narration_texts = []
-                    
-                    # Get product title
-                    product_title = ""
-                    if product_title_col is not None and product_title_col < len(row):
-                        product_title = row[product_title_col].strip()
-                    
-                    # Get product description
-                    product_description = ""
-                    if product_description_col is not None and product_description_col < len(row):
-                        product_description = row[product_description_col].strip()
-                    
-                    # Get brand
-                    brand = ""
-                    if brand_col is not None and brand_col < len(row):
-                        brand = row[brand_col].strip()
-                    
-                    # Get price
-                    price = ""
-                    if price_col is not None and price_col < len(row):
-                        price = row[price_col].strip()
-                    
-                    # Create narration text
-                    if product_title:
-                        narration_texts.append(f"Check out this amazing product: {product_title}")
-                    
-                    if brand:
-                        narration_texts.append(f"Brand: {brand}")
-                    
-                    if product_description:
-                        # Split long descriptions into multiple sentences
-                        sentences = product_description.split('.')
-                        for sentence in sentences:
-                            sentence = sentence.strip()
-                            if sentence:
-                                narration_texts.append(sentence)
-                    
-                    if price:
-                        narration_texts.append(f"Price: {price}")
-                    
-                    # Add a call to action
-                    narration_texts.append("Don't miss out on this great deal!")
-                    
+                if images:
+                    # Encode on the conversion pool while the next rows download; only keep
+                    # as many products in flight as the pool can encode, to bound memory
+                    running = [job[3] for job in encodes if not job[3].done()]
+                    if len(running) >= MAX_CONCURRENT_CONVERSIONS:
+                        wait(running, return_when=FIRST_COMPLETED)
                     # Create a separate output path for this product
                     product_output_path = os.path.join(UPLOAD_FOLDER, f"product_{row_num}_output.mp4")
-                    success, message = create_video_from_images(
-                        image_paths, 
+                    future = conversion_pool.submit(
+                        create_video_from_images,
+                        images, 
                         product_output_path, 
                         duration_per_image, 
                         narration_texts, 
                         language_code, 
                         voice_name,
-                        api_key
+                        api_key,
+                        audio_files
                     )
-                    if success:
-                        product_videos.append({
-                            'product_id': row_num,
-                            'output_path': product_output_path,
-                            'image_count': len(image_paths)
-                        })
-                    
-                    # Clean up downloaded images for this product
-                    for image_path in image_paths:
-                        if os.path.exists(image_path):
-                            os.remove(image_path)
+                    encodes.append((row_num, product_output_path, len(images), future))
+                else:
+                    for audio_file in audio_files:
+                        cleanup_file(audio_file)
+                    cleanup_file(image_dir)
             
-            # Clean up temp directory
-            if os.path.exists(temp_image_dir):
-                os.rmdir(temp_image_dir)
+            for row_num, product_output_path, image_count, future in encodes:
+                success, message = future.result()
+                if success:
+                    product_videos.append({
+                        'product_id': row_num,
+                        'output_path': product_output_path,
+                        'image_count': image_count
+                    })
             
             # If we created any product videos, return success
             if product_videos:
@@ -697,62 +1146,149 @@ def process_csv_and_create_video(csv_path, duration_per_image=3, language_code="
                 return False, "No valid image URLs found in CSV file"
             
     except Exception as e:
-        logger.error(f"Error processing CSV file: {str(e)}")
+        logger.error("Error processing CSV file: %s", e)
         return False, f"Error processing CSV file: {str(e)}"
 
+# Videos made by /api/csv-to-video in this process:
+# batch file_id -> {download filename: (product_id, path)}, oldest batch first.
+# Only the newest PRODUCT_VIDEO_BATCHES batches are kept; older ones are still
+# found through their product_videos_<file_id> directory.
+product_video_files = OrderedDict()
+product_video_files_lock = threading.Lock()
+PRODUCT_VIDEO_BATCHES = 256
+
+def forget_product_videos(file_id):
+    """Drop a batch whose output directory is gone."""
+    with product_video_files_lock:
+        product_video_files.pop(file_id, None)
+
+def save_upload(file, dst_path):
+    """Write an uploaded file to disk.
+
+    Large parts spooled by UploadRequest are hard-linked into place. Other
+    on-disk spools are copied in-kernel with os.copy_file_range; anything
+    else is copied in UPLOAD_CHUNK_SIZE chunks instead of FileStorage.save's
+    16 KB default.
+    """
+    src = file.stream
+    spool_path = getattr(src, 'name', None)
+    if isinstance(spool_path, str):
+        try:
+            src.flush()
+            os.link(spool_path, dst_path)
+            return
+        except OSError:
+            # Different filesystem or no hard links; copy instead
+            pass
+    with open(dst_path, 'wb') as dst:
+        try:
+            src_fd = src.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            src_fd = None
+        if src_fd is not None and hasattr(os, 'copy_file_range'):
+            offset = src.tell()
+            remaining = os.fstat(src_fd).st_size - offset
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(src_fd, dst.fileno(), remaining, offset_src=offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+                    remaining -= copied
+                return
+            except OSError:
+                # Not supported for this pair of files; fall back to a buffered copy
+                src.seek(offset)
+        shutil.copyfileobj(src, dst, length=UPLOAD_CHUNK_SIZE)
+
+def _request_flag(name):
+    """Read a boolean flag from the query string or form fields."""
+    return request.values.get(name, 'false').lower() in ('1', 'true')
+
 @app.route('/')
 def index():
     """Render the main page with upload interface."""
     return render_template('index.html')
 
-@app.route('/api/convert', methods=['POST'])
+@app.route('/api/convert', methods=['POST', 'PUT'])
 def convert_video():
-    """API endpoint for converting webm to mp4."""
+    """API endpoint for converting webm to mp4.
+
+    POST takes a multipart upload in the `file` field. PUT takes the raw
+    WebM bytes as the request body (filename via `?filename=` or the
+    `X-Filename` header), which skips multipart parsing entirely.
+    """
     try:
-        # Check if file is present in request
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-        
-        file = request.files['file']
-        
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+        file = None
+        if request.method == 'PUT':
+            filename = request.args.get('filename') or request.headers.get('X-Filename') or 'unknown.webm'
+        else:
+            # Check if file is present in request
+            if 'file' not in request.files:
+                return jsonify({'error': 'No file provided'}), 400
+            
+            file = request.files['file']
+            
+            if file.filename == '':
+                return jsonify({'error': 'No file selected'}), 400
+            filename = file.filename
         
-        if not allowed_file(file.filename):
+        if not allowed_file(filename, WEBM_SUFFIXES):
             return jsonify({'error': 'Invalid file type. Only WebM files are allowed'}), 400
         
         # Generate unique filenames
-        file_id = str(uuid.uuid4())
-        original_filename = secure_filename(file.filename or 'unknown.webm')
-        # Create output filename with same name but .mp4 extension
-        output_name = os.path.splitext(original_filename)[0] + '.mp4'
-        input_filename = f"{file_id}_input.webm"
-        output_filename = f"{file_id}_output.mp4"
-        
-        input_path = os.path.join(UPLOAD_FOLDER, input_filename)
-        output_path = os.path.join(UPLOAD_FOLDER, output_filename)
-        
-        # Save uploaded file
-        file.save(input_path)
-        logger.info(f"File uploaded: {input_path}")
-        
-        # Validate the uploaded file
-        is_valid, validation_message = validate_webm_file(input_path)
-        if not is_valid:
-            cleanup_file(input_path)
-            return jsonify({'error': validation_message}), 400
+        file_id = new_file_id()
+        base_path = os.path.join(UPLOAD_FOLDER, file_id)
+        output_path = base_path + '_output.mp4'
+        
+        # Stream the upload straight into ffmpeg; no input file is written
+        stream = request.stream if file is None else file.stream
+        
+        # Cheap container check; ffmpeg itself rejects malformed input
+        head = stream.read(WEBM_SNIFF_SIZE)
+        if not is_webm_header(head):
+            return jsonify({'error': 'File is not a valid WebM format'}), 400
+        
+        # Only sanitized for echoing back / download naming, so skip it for rejected uploads
+        original_filename = safe_filename(filename, 'unknown.webm')
+        
+        # Copy the video stream instead of re-encoding when it is already H.264
+        # or the client accepts non-H.264 MP4
+        remux = (_request_flag('remux') or 'codecs=vp9' in request.headers.get('Accept', '')
+                 or has_h264_video(head))
+        
+        # Opt-in async mode: hand the upload to the bounded conversion queue and return 202
+        if _request_flag('async'):
+            input_path = base_path + '_input.webm'
+            with open(input_path, 'wb') as f:
+                f.write(head)
+                shutil.copyfileobj(stream, f, length=UPLOAD_CHUNK_SIZE)
+            logger.info("File uploaded: %s", input_path)
+            
+            update_queue_status(file_id, 'queued', 'Waiting in queue...', filename=original_filename)
+            conversion_pool.submit(process_conversion, {
+                'file_id': file_id,
+                'input_path': input_path,
+                'output_path': output_path,
+                'original_filename': original_filename,
+                'remux': remux
+            })
+            
+            return jsonify({
+                'success': True,
+                'message': 'File queued for conversion',
+                'file_id': file_id,
+                'original_filename': original_filename,
+                'status_url': f"/api/status/{file_id}"
+            }), 202
         
         # Convert the file
-        success, message = convert_webm_to_mp4(input_path, output_path)
+        success, message = convert_stream_to_mp4(stream, output_path, head, remux)
         
         if not success:
-            cleanup_file(input_path)
             cleanup_file(output_path)
             return jsonify({'error': message}), 500
         
-        # Clean up input file
-        cleanup_file(input_path)
-        
         # Check if output file was created
         if not os.path.exists(output_path):
             return jsonify({'error': 'Conversion failed - output file not created'}), 500
@@ -768,8 +1304,8 @@ def convert_video():
     except RequestEntityTooLarge:
         return jsonify({'error': 'File too large. Maximum size is 500MB'}), 413
     except Exception as e:
-        logger.error(f"Conversion error: {str(e)}")
-    return jsonify({'error': f'Server error: {str(e)}'}), 500
+        logger.error("Conversion error: %s", e)
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 @app.route('/api/render-video', methods=['POST'])
 def render_video_from_assets():
@@ -786,6 +1322,7 @@ def render_video_from_assets():
     }
     Returns: { success, file_id, download_url }
     """
+    temp_dir = None
     try:
         data = request.get_json(silent=True) or {}
         images = data.get('images') or []
@@ -805,7 +1342,7 @@ def render_video_from_assets():
         font_size = int(opts.get('fontSize', 40))
         watermark = opts.get('watermark', '')
 
-        file_id = str(uuid.uuid4())
+        file_id = new_file_id()
         temp_dir = os.path.join(UPLOAD_FOLDER, f"render_{file_id}")
         os.makedirs(temp_dir, exist_ok=True)
 
@@ -835,32 +1372,22 @@ def render_video_from_assets():
         else:
             return jsonify({ 'error': 'audioSrc must be a data URL or http(s) URL' }), 400
 
-        # Optionally convert audio to WAV for consistent ffmpeg muxing
-        wav_audio_path = os.path.join(temp_dir, 'audio.wav')
-        try:
-            cmd = ['ffmpeg', '-i', audio_path, '-ac', '2', '-ar', '44100', '-y', wav_audio_path]
-            subprocess.run(cmd, capture_output=True, text=True, timeout=180)
-            use_audio_path = wav_audio_path if os.path.exists(wav_audio_path) else audio_path
-        except Exception:
-            use_audio_path = audio_path
-
-        # Determine total audio duration
-        total_audio_sec = _probe_duration_seconds(use_audio_path)
-
         # Decide which images to use for scenes (skip thumbnail if count matches)
         image_list = images
         if len(images) == len(scenes) + 1:
             image_list = images[1:]
 
         # Save images to files and prepare durations
-        frame_paths = []
-        for i, img in enumerate(image_list):
+        def save_frame(i, img):
             out = os.path.join(temp_dir, f"frame_{i:03d}.png")
             if not _download_or_decode_image_to_file(img, out):
                 # fallback to blank frame
-                cmd = ['ffmpeg', '-f', 'lavfi', '-i', f'color=c=black:s={width}x{height}', '-vframes', '1', '-y', out]
-                subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            frame_paths.append(out)
+                cmd = ['ffmpeg', '-nostats', '-f', 'lavfi', '-i', f'color=c=black:s={width}x{height}', '-vframes', '1', '-y', out]
+                run_ffmpeg(cmd, timeout=30)
+            return out
+
+        # Downloads and base64 decodes are independent, so fetch all frames at once
+        frame_paths = [f.result() for f in [io_pool.submit(save_frame, i, img) for i, img in enumerate(image_list)]]
 
         if not frame_paths:
             return jsonify({ 'error': 'No valid frames available' }), 400
@@ -877,61 +1404,52 @@ def render_video_from_assets():
                 if isinstance(st, (int, float)) and isinstance(en, (int, float)) and en > st:
                     durations.append(float(en - st))
         if not durations:
-            # Even distribution
+            # Even distribution over the audio
+            total_audio_sec = _probe_duration_seconds(audio_path)
             base = (total_audio_sec / num_scenes) if total_audio_sec > 0 else 3.0
             durations = [base for _ in range(num_scenes)]
 
         # Build concat list file
         list_path = os.path.join(temp_dir, 'frames.txt')
+        lines = [f"file '{frame_paths[i]}'\nduration {durations[i]}\n" for i in range(num_scenes)]
+        # Repeat last frame once per concat demuxer rules; without it the last duration is ignored
+        lines.append(f"file '{frame_paths[num_scenes-1]}'\n")
         with open(list_path, 'w') as f:
-            for i in range(num_scenes):
-                f.write(f"file '{frame_paths[i]}'\n")
-                f.write(f"duration {durations[i]}\n")
-            # Repeat last frame once per concat demuxer rules
-            f.write(f"file '{frame_paths[num_scenes-1]}'\n")
-
-        # Create slideshow video scaled to target
-        slideshow_path = os.path.join(temp_dir, 'slideshow.mp4')
-        vf = f"scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1"
-        cmd = [
-            'ffmpeg', '-f', 'concat', '-safe', '0', '-i', list_path,
-            '-vf', vf, '-r', str(fps), '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-y', slideshow_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-        if result.returncode != 0:
-            return jsonify({ 'error': f"Failed to create slideshow: {result.stderr}" }), 500
+            f.write(''.join(lines))
 
-        # Optional subtitles
-        video_for_mux = slideshow_path
-        srt_path = None
+        # Scale, captions, watermark, encode and audio mux all happen in one ffmpeg run.
+        # The concat demuxer yields one frame per image; fps duplicates it only after
+        # scale/pad, so each image is scaled once while captions still get every frame.
+        filters = [f"scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps}"]
         if show_subs and scenes:
             srt_path = os.path.join(temp_dir, 'captions.srt')
             _build_srt_from_scenes(scenes[:num_scenes], durations, srt_path)
-            subtitled_path = os.path.join(temp_dir, 'subtitled.mp4')
-            cmd = [
-                'ffmpeg', '-i', slideshow_path,
-                '-vf', f"subtitles={srt_path}", '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-y', subtitled_path
-            ]
-            res2 = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-            if res2.returncode == 0 and os.path.exists(subtitled_path):
-                video_for_mux = subtitled_path
-
-        # Optional watermark
+            filters.append(f"subtitles={srt_path}")
         if watermark:
-            watermarked_path = os.path.join(temp_dir, 'watermarked.mp4')
-            drawtext = f"drawtext=fontfile=/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf:text='{watermark}':fontcolor=white@0.8:fontsize=24:x=w-tw-10:y=10"
-            cmd = ['ffmpeg', '-i', video_for_mux, '-vf', drawtext, '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-y', watermarked_path]
-            res3 = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-            if res3.returncode == 0 and os.path.exists(watermarked_path):
-                video_for_mux = watermarked_path
-
-        # Mux with audio
+            # Read the text from a file so quotes, colons and % in it aren't parsed as filter syntax
+            watermark_path = os.path.join(temp_dir, 'watermark.txt')
+            with open(watermark_path, 'w', encoding='utf-8') as f:
+                f.write(str(watermark))
+            filters.append(f"drawtext=fontfile=/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf:textfile={watermark_path}:expansion=none:fontcolor=white@0.8:fontsize=24:x=w-tw-10:y=10")
+
         out_filename = f"{file_id}_render.mp4"
         out_path = os.path.join(UPLOAD_FOLDER, out_filename)
-        cmd = ['ffmpeg', '-i', video_for_mux, '-i', use_audio_path, '-c:v', 'copy', '-c:a', 'aac', '-shortest', '-y', out_path]
-        res4 = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-        if res4.returncode != 0 or not os.path.exists(out_path):
-            return jsonify({ 'error': f"Failed to mux audio: {res4.stderr}" }), 500
+
+        def render(vf):
+            video_args = lambda encoder: _encode_args(encoder, vf)
+            cmd = [
+                'ffmpeg', '-nostats', '-f', 'concat', '-safe', '0', '-i', list_path, '-i', audio_path,
+                '-map', '0:v', '-map', '1:a', *video_args(VIDEO_ENCODER), '-c:a', 'aac', '-shortest', '-y', out_path
+            ]
+            return _run_encode(cmd, video_args)
+
+        result = render(','.join(filters))
+        if result.returncode != 0 and len(filters) > 1:
+            # Captions and watermark are optional; still deliver the video without them
+            logger.warning("Render with captions/watermark failed, retrying without: %s", result.stderr)
+            result = render(filters[0])
+        if result.returncode != 0 or not os.path.exists(out_path):
+            return jsonify({ 'error': f"Failed to render video: {result.stderr}" }), 500
 
         # Success
         return jsonify({
@@ -940,43 +1458,108 @@ def render_video_from_assets():
             'download_url': f"/api/download-render/{file_id}",
         }), 200
     except Exception as e:
-        logger.error(f"Render error: {e}")
+        logger.error("Render error: %s", e)
         return jsonify({ 'error': f'Server error: {str(e)}' }), 500
+    finally:
+        # Frames, audio and intermediate videos are not needed once the final mux is written
+        if temp_dir:
+            cleanup_file(temp_dir)
+
+def send_video(path, download_name):
+    """Send an MP4 as an attachment, keeping sendfile(2) for Range requests.
+
+    send_file hands whole files to wsgi.file_wrapper, but answers a Range
+    request by wrapping the file in a Python-level slice iterator. Open-ended
+    ranges (`bytes=N-`, what players send when seeking and clients send
+    when resuming) run to the end of the file, so the file wrapper can be
+    used again with the file positioned at the range start; gunicorn then
+    sendfile()s from that offset.
+    """
+    if X_ACCEL_REDIRECT_PREFIX:
+        # nginx serves the file itself, including Range and conditional requests
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        response = Response(mimetype='video/mp4')
+        response.headers['X-Accel-Redirect'] = X_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + os.path.relpath(path, UPLOAD_FOLDER)
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+        return response
+    response = send_file(path, as_attachment=True, download_name=download_name,
+                         mimetype='video/mp4', conditional=True)
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    content_range = response.content_range
+    if (response.status_code == 206 and file_wrapper is not None and not response.headers.get('X-Sendfile')
+            and content_range.stop == content_range.length):
+        f = open(path, 'rb')
+        f.seek(content_range.start)
+        response.response.close()
+        response.response = file_wrapper(f, UPLOAD_CHUNK_SIZE)
+        response.direct_passthrough = True
+    return response
 
 @app.route('/api/download-render/<file_id>')
 def download_render(file_id):
+    if not FILE_ID_RE.match(file_id):
+        return jsonify({ 'error': 'Invalid file ID' }), 400
     try:
-        uuid.UUID(file_id)
         out_path = os.path.join(UPLOAD_FOLDER, f"{file_id}_render.mp4")
         if not os.path.exists(out_path):
             return jsonify({ 'error': 'File not found or has been cleaned up' }), 404
-        return send_file(out_path, as_attachment=True, download_name=f"render_{file_id}.mp4", mimetype='video/mp4')
-    except ValueError:
-        return jsonify({ 'error': 'Invalid file ID' }), 400
+        return send_video(out_path, f"render_{file_id}.mp4")
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Download render error: {e}")
+        logger.error("Download render error: %s", e)
         return jsonify({ 'error': f'Server error: {str(e)}' }), 500
 
+def _follow_conversion_output(file_id, output_path):
+    """Yield a fragmented MP4 while its queued conversion is still writing it.
+
+    If the conversion fails or restarts with a fallback encoder, the
+    generator raises so the response is cut off instead of ending as a
+    complete-looking but corrupt 200.
+    """
+    with open(output_path, 'rb') as f:
+        inode = os.fstat(f.fileno()).st_ino
+        while True:
+            chunk = f.read(UPLOAD_CHUNK_SIZE)
+            if chunk:
+                yield chunk
+                continue
+            status = (job_status(file_id) or {}).get('status')
+            try:
+                replaced = os.stat(output_path).st_ino != inode
+            except FileNotFoundError:
+                replaced = True
+            if replaced:
+                raise RuntimeError(f"Conversion {file_id} restarted; aborting download")
+            if status != 'processing':
+                if status != 'completed':
+                    raise RuntimeError(f"Conversion {file_id} failed; aborting download")
+                # Drain whatever was written between the last read and the status change
+                yield from iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b'')
+                break
+            time.sleep(0.2)
+
 @app.route('/api/download/<file_id>')
 def download_file(file_id):
     """Download converted mp4 file."""
+    # Validate file_id format (should be a valid UUID)
+    if not FILE_ID_RE.match(file_id):
+        return jsonify({'error': 'Invalid file ID'}), 400
     try:
-        # Validate file_id format (should be a valid UUID)
-        uuid.UUID(file_id)
-        
         output_filename = f"{file_id}_output.mp4"
         output_path = os.path.join(UPLOAD_FOLDER, output_filename)
         
+        status_info = job_status(file_id) or {}
+        processing = status_info.get('status') == 'processing'
+        
         if not os.path.exists(output_path):
+            if processing:
+                return jsonify({'error': 'Conversion has not produced any output yet'}), 409
             return jsonify({'error': 'File not found or has been cleaned up'}), 404
         
-        # Send file and schedule cleanup after download
-        def remove_file(response):
-            cleanup_file(output_path)
-            return response
-        
         # Use the original filename with .mp4 extension for download
-        original_filename = queue_status.get(file_id, {}).get('filename', f'converted_{file_id}.mp4')
+        original_filename = status_info.get('filename') or f'converted_{file_id}.mp4'
         # If it's a CSV file, change the base name to indicate it's a video
         if original_filename.lower().endswith('.csv'):
             base_name = os.path.splitext(original_filename)[0]
@@ -984,41 +1567,43 @@ def download_file(file_id):
         else:
             download_name = os.path.splitext(original_filename)[0] + '.mp4'
         
-        return send_file(
-            output_path,
-            as_attachment=True,
-            download_name=download_name,
-            mimetype='video/mp4'
-        )
-        
-    except ValueError:
-        return jsonify({'error': 'Invalid file ID'}), 400
+        # Queued conversions write fragmented MP4, so stream it while ffmpeg is still going
+        if processing:
+            return Response(
+                _follow_conversion_output(file_id, output_path),
+                mimetype='video/mp4',
+                headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
+            )
+        
+        # Pass the path rather than an open handle: Werkzeug still wraps the file
+        # with wsgi.file_wrapper (sendfile on gunicorn/uWSGI) and can also set
+        # Content-Length, answer Range requests and emit X-Sendfile
+        return send_video(output_path, download_name)
+        
+    except HTTPException:
+        # e.g. 416 for an unsatisfiable Range header
+        raise
     except Exception as e:
-        logger.error(f"Download error: {str(e)}")
+        logger.error("Download error: %s", e)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 @app.route('/api/status')
 def api_status():
     """Check API status and ffmpeg availability."""
-    try:
-        # Test ffmpeg availability
-        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, timeout=10)
-        ffmpeg_available = result.returncode == 0
-    except Exception:
-        ffmpeg_available = False
-    
     # Get queue status
-    with queue_lock:
-        queue_size = conversion_queue.qsize()
-        active_jobs = len(queue_status)
+    statuses = queue_status.copy()
+    queue_size = queued_count(statuses)
+    active_jobs = len(statuses)
     
     return jsonify({
         'status': 'online',
-        'ffmpeg_available': ffmpeg_available,
+        'ffmpeg_available': ffmpeg_available(),
+        'video_encoder': VIDEO_ENCODER,
         'max_file_size_mb': app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024),
         'supported_formats': ['webm', 'csv'],
         'queue_size': queue_size,
-        'active_jobs': active_jobs
+        'active_jobs': active_jobs,
+        'queue_events': QUEUE_EVENTS_ENABLED
     })
 
 @app.route('/api/bulk-convert', methods=['POST'])
@@ -1042,49 +1627,45 @@ def bulk_convert_videos():
             if file.filename == '':
                 continue
                 
-            if not allowed_file(file.filename):
+            if not allowed_file(file.filename, WEBM_SUFFIXES):
                 rejected_files.append({
                     'filename': file.filename,
                     'reason': 'Invalid file type. Only WebM files are allowed'
                 })
                 continue
             
-            # Generate unique filenames
-            file_id = str(uuid.uuid4())
-            original_filename = secure_filename(file.filename or 'unknown.webm')
-            # Create output filename with same name but .mp4 extension
-            output_name = os.path.splitext(original_filename)[0] + '.mp4'
-            input_filename = f"{file_id}_input.webm"
-            output_filename = f"{file_id}_output.mp4"
+            # Check the EBML header before anything is written to disk
+            head = file.stream.read(WEBM_HEADER_SIZE)
+            file.stream.seek(0)
+            if not is_webm_header(head):
+                rejected_files.append({
+                    'filename': safe_filename(file.filename, ''),
+                    'reason': "File is not a valid WebM format"
+                })
+                continue
             
-            input_path = os.path.join(UPLOAD_FOLDER, input_filename)
-            output_path = os.path.join(UPLOAD_FOLDER, output_filename)
+            # Generate unique filenames
+            file_id = new_file_id()
+            original_filename = safe_filename(file.filename, 'unknown.webm')
+            base_path = os.path.join(UPLOAD_FOLDER, file_id)
+            input_path = base_path + '_input.webm'
+            output_path = base_path + '_output.mp4'
             
             # Save uploaded file
-            file.save(input_path)
-            logger.info(f"File uploaded: {input_path}")
+            save_upload(file, input_path)
+            logger.info("File uploaded: %s", input_path)
             
-            # Validate the uploaded file
-            is_valid, validation_message = validate_webm_file(input_path)
-            if not is_valid:
-                cleanup_file(input_path)
-                rejected_files.append({
-                    'filename': original_filename,
-                    'reason': validation_message
-                })
-                continue
+            # Initialize queue status before a pool thread can pick the job up
+            update_queue_status(file_id, 'queued', 'Waiting in queue...', filename=original_filename)
             
             # Add to conversion queue
-            conversion_queue.put({
+            conversion_pool.submit(process_conversion, {
                 'file_id': file_id,
                 'input_path': input_path,
                 'output_path': output_path,
                 'original_filename': original_filename
             })
             
-            # Initialize queue status
-            update_queue_status(file_id, 'queued', 'Waiting in queue...', filename=original_filename)
-            
             queued_files.append({
                 'file_id': file_id,
                 'filename': original_filename
@@ -1100,28 +1681,114 @@ def bulk_convert_videos():
     except RequestEntityTooLarge:
         return jsonify({'error': 'File too large. Maximum size is 500MB'}), 413
     except Exception as e:
-        logger.error(f"Bulk conversion error: {str(e)}")
+        logger.error("Bulk conversion error: %s", e)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
-@app.route('/api/queue-status')
-def get_queue_status():
-    """Get the status of all files in the conversion queue."""
+@app.route('/api/status/<file_id>')
+def get_conversion_status(file_id):
+    """Get the status of a single queued conversion or async CSV batch."""
+    # Validate file_id format (should be a valid UUID)
+    if not FILE_ID_RE.match(file_id):
+        return jsonify({'error': 'Invalid file ID'}), 400
     try:
-        with queue_lock:
-            # Create a copy of queue status
-            status_copy = {}
-            for file_id, status_info in queue_status.items():
-                status_copy[file_id] = status_info.copy()
+        status_info = job_status(file_id) or csv_jobs.get(file_id)
+        
+        if status_info is None:
+            return jsonify({'error': 'Unknown file ID'}), 404
         
         return jsonify({
             'success': True,
-            'queue_status': status_copy,
-            'queue_size': conversion_queue.qsize()
+            'file_id': file_id,
+            **status_info
         })
     except Exception as e:
-        logger.error(f"Queue status error: {str(e)}")
+        logger.error("Conversion status error: %s", e)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+# (queue_version, serialized body) of the last /api/queue-status response
+queue_status_body = (None, b'')
+
+@app.route('/api/queue-status')
+def get_queue_status():
+    """Get the status of all files in the conversion queue."""
+    global queue_status_body
+    try:
+        # Polling clients mostly see an unchanged queue, so reuse the bytes until the next update
+        version, body = queue_status_body
+        if version != queue_version:
+            version = queue_version
+            # Entries are replaced rather than mutated, so a shallow copy is a consistent snapshot
+            status_copy = queue_status.copy()
+            body = json.dumps({
+                'success': True,
+                'queue_status': status_copy,
+                'queue_size': queued_count(status_copy)
+            }, separators=(',', ':')).encode()
+            queue_status_body = (version, body)
+        
+        return Response(body, mimetype='application/json')
+    except Exception as e:
+        logger.error("Queue status error: %s", e)
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+
+def _queue_events():
+    """Yield server-sent events: a full snapshot, then batched changes."""
+    seen = queue_version
+    deadline = time.monotonic() + QUEUE_EVENT_MAX_AGE
+    yield f"event: snapshot\ndata: {json.dumps(queue_status.copy())}\n\n"
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            # Release the worker thread; the browser reconnects and gets a fresh snapshot
+            return
+        with queue_changed:
+            changed = queue_changed.wait_for(lambda: queue_version > seen,
+                                             timeout=min(QUEUE_EVENT_KEEPALIVE, remaining))
+        if not changed:
+            yield ": keep-alive\n\n"
+            continue
+        # Let a burst of updates land so they go out as one event
+        time.sleep(QUEUE_EVENT_INTERVAL)
+        latest = queue_version
+        versions = queue_versions.copy()
+        diff = {file_id: queue_status[file_id] for file_id, version in versions.items() if version > seen}
+        seen = latest
+        yield f"data: {json.dumps(diff)}\n\n"
+
+@app.route('/api/queue-events')
+def queue_events():
+    """Stream queue status changes as server-sent events instead of polling /api/queue-status."""
+    if not QUEUE_EVENTS_ENABLED:
+        return jsonify({'error': 'Queue events are disabled; poll /api/queue-status'}), 404
+    return Response(_queue_events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def register_product_videos(file_id, results):
+    """Record a CSV batch's rendered videos for download and return their descriptions."""
+    product_videos = []
+    batch_files = {}
+    for video_info in results:
+        if not video_info.get('error'):
+            product_id = video_info['product_id']
+            product_title = video_info['product_title']
+            # The renderer already made the file names safe and unique within the batch
+            download_filename = os.path.basename(video_info['output_path'])
+            batch_files[download_filename] = (product_id, video_info['output_path'])
+            
+            product_videos.append({
+                'product_id': product_id,
+                'product_title': product_title,
+                'download_url': f"/api/download-product-video-ffmpeg/{file_id}/{download_filename}",
+                'message': video_info.get('message', 'Video created successfully')
+            })
+    
+    with product_video_files_lock:
+        product_video_files[file_id] = batch_files
+        while len(product_video_files) > PRODUCT_VIDEO_BATCHES:
+            product_video_files.popitem(last=False)
+    return product_videos
+
 @app.route('/api/csv-to-video', methods=['POST'])
 def csv_to_video():
     """API endpoint for creating videos from CSV files with product data using FFmpeg rendering."""
@@ -1135,7 +1802,7 @@ def csv_to_video():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        if not allowed_file(file.filename):
+        if not allowed_file(file.filename, CSV_SUFFIXES):
             return jsonify({'error': 'Invalid file type. Only CSV files are allowed'}), 400
         
         # Get parameters for FFmpeg-based video creation
@@ -1152,30 +1819,40 @@ def csv_to_video():
         outro_text = request.form.get('outro_text', '')
         
         # Generate unique ID for this batch
-        file_id = str(uuid.uuid4())
-        original_filename = secure_filename(file.filename or 'unknown.csv')
+        file_id = new_file_id()
+        original_filename = safe_filename(file.filename, 'unknown.csv')
         input_filename = f"{file_id}_input.csv"
         output_dir = os.path.join(UPLOAD_FOLDER, f"product_videos_{file_id}")
         
         input_path = os.path.join(UPLOAD_FOLDER, input_filename)
         
         # Save uploaded file
-        file.save(input_path)
-        logger.info(f"CSV file uploaded: {input_path}")
+        save_upload(file, input_path)
+        logger.info("CSV file uploaded: %s", input_path)
+        
+        params = (duration_per_scene, voice_name, gemini_api_key, show_subtitles,
+                  font_style, font_size, watermark, outro_text)
+        
+        # Opt-in async mode: render on the CSV pool and let the client poll /api/status/<file_id>
+        if _request_flag('async'):
+            update_csv_job(file_id, 'queued', 'Waiting in queue...', filename=original_filename)
+            csv_pool.submit(process_csv_job, {
+                'file_id': file_id,
+                'input_path': input_path,
+                'output_dir': output_dir,
+                'params': params
+            })
+            
+            return jsonify({
+                'success': True,
+                'message': 'CSV queued for video creation',
+                'file_id': file_id,
+                'original_filename': original_filename,
+                'status_url': f"/api/status/{file_id}"
+            }), 202
         
         # Process the CSV and create videos using our new FFmpeg-based approach
-        success, result = csv_to_video_ffmpeg.process_csv_and_create_videos(
-            input_path,
-            output_dir,
-            duration_per_scene,
-            voice_name,
-            gemini_api_key,
-            show_subtitles,
-            font_style,
-            font_size,
-            watermark,
-            outro_text
-        )
+        success, result = csv_to_video_ffmpeg.process_csv_and_create_videos(input_path, output_dir, *params)
         
         # Clean up input file
         cleanup_file(input_path)
@@ -1183,24 +1860,7 @@ def csv_to_video():
         if not success:
             return jsonify({'error': result[0].get('message', 'Failed to create videos')}), 500
         
-        # Create download URLs for each product video
-        product_videos = []
-        for video_info in result:
-            if not video_info.get('error'):
-                product_id = video_info['product_id']
-                product_title = video_info['product_title']
-                # Create a safe filename for download
-                safe_title = "".join(c for c in product_title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                if not safe_title:
-                    safe_title = f"product_{product_id}"
-                download_filename = f"{safe_title.replace(' ', '_')}.mp4"
-                
-                product_videos.append({
-                    'product_id': product_id,
-                    'product_title': product_title,
-                    'download_url': f"/api/download-product-video-ffmpeg/{file_id}/{download_filename}",
-                    'message': video_info.get('message', 'Video created successfully')
-                })
+        product_videos = register_product_videos(file_id, result)
         
         return jsonify({
             'success': True,
@@ -1213,71 +1873,75 @@ def csv_to_video():
     except RequestEntityTooLarge:
         return jsonify({'error': 'File too large. Maximum size is 500MB'}), 413
     except Exception as e:
-        logger.error(f"CSV to video error: {str(e)}")
+        logger.error("CSV to video error: %s", e)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 @app.route('/api/download-product-video/<file_id>/<product_id>')
 def download_product_video(file_id, product_id):
     """Download generated product video file."""
+    # Validate file_id format (should be a valid UUID)
+    if not FILE_ID_RE.match(file_id):
+        return jsonify({'error': 'Invalid file ID'}), 400
     try:
-        # Validate file_id format (should be a valid UUID)
-        uuid.UUID(file_id)
-        
         # Validate product_id is a number
         product_id = int(product_id)
         
-        output_filename = f"product_{product_id}_output.mp4"
-        output_path = os.path.join(UPLOAD_FOLDER, output_filename)
+        # Only videos from the batch that owns file_id are served
+        batch_files = product_video_files.get(file_id) or {}
+        output_path = next((path for pid, path in batch_files.values() if pid == product_id), None)
         
-        if not os.path.exists(output_path):
+        if output_path is None or not os.path.exists(output_path):
+            if batch_files and not os.path.isdir(os.path.join(UPLOAD_FOLDER, f"product_videos_{file_id}")):
+                forget_product_videos(file_id)
             return jsonify({'error': 'File not found or has been cleaned up'}), 404
         
         # Use a descriptive filename for download
         download_name = f"product_{product_id}_video.mp4"
         
-        return send_file(
-            output_path,
-            as_attachment=True,
-            download_name=download_name,
-            mimetype='video/mp4'
-        )
+        return send_video(output_path, download_name)
         
+    except HTTPException:
+        raise
     except ValueError:
         return jsonify({'error': 'Invalid file ID or product ID'}), 400
     except Exception as e:
-        logger.error(f"Product video download error: {str(e)}")
+        logger.error("Product video download error: %s", e)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 
 @app.route('/api/download-product-video-ffmpeg/<file_id>/<filename>')
 def download_product_video_ffmpeg(file_id, filename):
     """Download generated product video file created with FFmpeg."""
+    # Validate file_id format (should be a valid UUID)
+    if not FILE_ID_RE.match(file_id):
+        return jsonify({'error': 'Invalid file ID'}), 400
     try:
-        # Validate file_id format (should be a valid UUID)
-        uuid.UUID(file_id)
-        
         # Validate filename
         if not filename or '..' in filename or '/' in filename:
             return jsonify({'error': 'Invalid filename'}), 400
         
-        # Construct the path to the video file
-        output_dir = os.path.join(UPLOAD_FOLDER, f"product_videos_{file_id}")
-        output_path = os.path.join(output_dir, filename)
-        
-        if not os.path.exists(output_path):
-            return jsonify({'error': 'File not found or has been cleaned up'}), 404
-        
-        return send_file(
-            output_path,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='video/mp4'
-        )
-        
-    except ValueError:
-        return jsonify({'error': 'Invalid file ID'}), 400
+        # Videos made by this process are looked up directly; fall back to
+        # the batch directory for ones made before a restart or by another worker
+        batch_files = product_video_files.get(file_id)
+        if batch_files is not None:
+            entry = batch_files.get(filename)
+            if entry is None:
+                return jsonify({'error': 'File not found or has been cleaned up'}), 404
+            output_path = entry[1]
+        else:
+            output_path = os.path.join(UPLOAD_FOLDER, f"product_videos_{file_id}", filename)
+            if not os.path.exists(output_path):
+                return jsonify({'error': 'File not found or has been cleaned up'}), 404
+        
+        return send_video(output_path, filename)
+    except FileNotFoundError:
+        if not os.path.isdir(os.path.join(UPLOAD_FOLDER, f"product_videos_{file_id}")):
+            forget_product_videos(file_id)
+        return jsonify({'error': 'File not found or has been cleaned up'}), 404
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"FFmpeg product video download error: {str(e)}")
+        logger.error("FFmpeg product video download error: %s", e)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 @app.errorhandler(413)
@@ -1295,7 +1959,7 @@ def not_found(e):
 @app.errorhandler(500)
 def server_error(e):
     """Handle server errors."""
-    logger.error(f"Server error: {str(e)}")
+    logger.error("Server error: %s", e)
     if request.path.startswith('/api/'):
         return jsonify({'error': 'Internal server error'}), 500
     flash('An internal error occurred. Please try again.', 'error')
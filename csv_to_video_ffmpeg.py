@@ -1,19 +1,205 @@
 import os
-import uuid
 import logging
 import tempfile
 import subprocess
 import json
 import csv
 import requests
-from pathlib import Path
+import shutil
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Dict, Tuple, Optional
-import base64
+import binascii
+import hashlib
+import re
+import struct
+import time
+import wave
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Delimiters the CSV sniffer may pick from
+CSV_DELIMITERS = ',;\t|'
+
+# Description sentence boundaries, and the placeholder scraped exports use for missing fields
+SENTENCE_SPLIT_RE = re.compile(r'[.!?]+')
+NOT_AVAILABLE = "not available"
+
+# Image downloads and TTS calls are network-bound, so they share one thread pool
+IO_WORKERS = 16
+io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='csv-io')
+
+# Scratch dirs are removed in the background; pool threads are joined at interpreter exit
+cleanup_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='csv-cleanup')
+
+# Products render side by side; each one's ffmpeg runs are separate processes, so threads suffice.
+# The cores are split between them so concurrent encodes don't oversubscribe the CPU.
+PRODUCT_WORKERS = int(os.environ.get('CSV_PRODUCT_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+product_pool = ThreadPoolExecutor(max_workers=PRODUCT_WORKERS, thread_name_prefix='csv-product')
+FFMPEG_THREADS = str(max(1, (os.cpu_count() or 2) // PRODUCT_WORKERS))
+
+VIDEO_FPS = 30
+# Product slideshows are short previews of still images, so favour encode speed
+X264_ARGS = ['-c:v', 'libx264', '-preset', os.environ.get('CSV_X264_PRESET', 'veryfast'),
+             '-tune', 'stillimage', '-crf', '26', '-pix_fmt', 'yuv420p', '-threads', FFMPEG_THREADS]
+
+# Per-product scratch files go to RAM-backed /dev/shm when it has room
+SHM_DIR = '/dev/shm'
+SHM_MIN_FREE = 1024 * 1024 * 1024
+
+def _scratch_dir():
+    try:
+        if shutil.disk_usage(SHM_DIR).free > SHM_MIN_FREE:
+            return SHM_DIR
+    except OSError:
+        pass
+    return None
+
+# One keep-alive session for all outbound HTTP so TCP/TLS connections are reused;
+# idempotent requests are retried with a short backoff
+http_session = requests.Session()
+http_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64,
+                           max_retries=Retry(total=3, backoff_factor=0.2))
+http_session.mount('https://', http_adapter)
+http_session.mount('http://', http_adapter)
+
+# On-disk caches are directories of files named by a hash key. Hits bump the entry's
+# atime (set explicitly, so relatime/noatime mounts don't matter) and every store
+# evicts the least recently used entries once the directory is over its byte cap.
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def cache_fetch(cache_path: str, dest_path: str, max_age: float = None, link: bool = False) -> bool:
+    """Copy (or hard-link) a cache entry to dest_path; False on a miss or an expired entry."""
+    try:
+        st = os.stat(cache_path)
+        if max_age is not None and time.time() - st.st_mtime >= max_age:
+            return False
+        if link:
+            _link_or_copy(cache_path, dest_path)
+        else:
+            shutil.copyfile(cache_path, dest_path)
+        os.utime(cache_path, (time.time(), st.st_mtime))
+        return True
+    except OSError:
+        return False
+
+def cache_store(cache_path: str, src_path: str, max_bytes: int) -> None:
+    """Publish src_path as a cache entry, then trim the cache to max_bytes; failures only cost a later miss."""
+    cache_dir = os.path.dirname(cache_path)
+    tmp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        os.close(fd)
+        shutil.copyfile(src_path, tmp_path)
+        # Publish atomically so concurrent readers never see a partial entry
+        os.replace(tmp_path, cache_path)
+        tmp_path = None
+        _evict_cache(cache_dir, max_bytes)
+    except OSError as e:
+        logger.warning("Could not cache %s: %s", cache_path, e)
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _evict_cache(cache_dir: str, max_bytes: int) -> None:
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_atime, st.st_size, entry.path))
+            total += st.st_size
+    if total <= max_bytes:
+        return
+    entries.sort()
+    for _, size, path in entries:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        if total <= max_bytes:
+            break
+
+# Synthesized speech keyed by model, voice and text, so lines that repeat across
+# products and uploads skip the Gemini call
+TTS_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'tts_cache')
+TTS_CACHE_TTL = int(os.environ.get('TTS_CACHE_TTL', 7 * 86400))
+TTS_CACHE_MAX_BYTES = int(os.environ.get('TTS_CACHE_MAX_MB', 256)) * 1024 * 1024
+
+# File extension for each audio type Gemini may return; raw PCM is written out as WAV
+AUDIO_EXTENSIONS = {
+    'audio/l16': '.wav', 'audio/pcm': '.wav', 'audio/wav': '.wav', 'audio/x-wav': '.wav',
+    'audio/mpeg': '.mp3', 'audio/mp3': '.mp3', 'audio/ogg': '.ogg',
+}
+TTS_CACHE_EXTENSIONS = ('.wav', '.mp3', '.ogg')
+
+def _tts_cache_key(model: str, voice_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model}|{voice_name}|{text}".encode('utf-8')).hexdigest()
+
+def copy_cached_speech(model: str, voice_name: str, text: str, output_path: str) -> bool:
+    """Copy previously synthesized speech to output_path; False on a cache miss."""
+    key = _tts_cache_key(model, voice_name, text)
+    return any(cache_fetch(os.path.join(TTS_CACHE_DIR, key + ext), output_path, max_age=TTS_CACHE_TTL)
+               for ext in TTS_CACHE_EXTENSIONS)
+
+def cache_speech(model: str, voice_name: str, text: str, audio_path: str, mime_type: str) -> None:
+    """Store synthesized speech of the given MIME type in the TTS cache; failures only cost a later API call."""
+    ext = AUDIO_EXTENSIONS.get(mime_type.split(';')[0].strip())
+    if ext is None:
+        logger.info("Not caching speech of unknown type %s", mime_type)
+        return
+    cache_path = os.path.join(TTS_CACHE_DIR, _tts_cache_key(model, voice_name, text) + ext)
+    cache_store(cache_path, audio_path, TTS_CACHE_MAX_BYTES)
+
+def write_streamed_audio(response, output_path: str) -> Optional[str]:
+    """Decode the audio parts of a streamed (alt=sse) Gemini response into output_path as events arrive.
+
+    Raw PCM (audio/L16) gets a WAV header so the file can be used without transcoding.
+    Returns the (lowercased) MIME type of the audio, or None if the response had none.
+    """
+    mime_type = None
+    pcm = False
+    with response, open(output_path, 'wb') as out:
+        for line in response.iter_lines(chunk_size=64 * 1024):
+            if not line.startswith(b'data:'):
+                continue
+            event = json.loads(line[5:])
+            for candidate in event.get("candidates", [])[:1]:
+                for part in candidate.get("content", {}).get("parts", []):
+                    inline = part.get("inlineData")
+                    if inline and inline.get("mimeType", "").startswith("audio/"):
+                        if mime_type is None:
+                            mime_type = inline["mimeType"].lower()
+                            if mime_type.startswith(("audio/l16", "audio/pcm")):
+                                rate = re.search(r'rate=(\d+)', mime_type)
+                                out.write(create_wav_header(sample_rate=int(rate.group(1)) if rate else 24000))
+                                pcm = True
+                        out.write(binascii.a2b_base64(inline["data"]))
+        if pcm:
+            # Fill in the RIFF and data chunk sizes now that the length is known
+            data_size = out.tell() - 44
+            out.seek(4)
+            out.write(struct.pack('<I', 36 + data_size))
+            out.seek(40)
+            out.write(struct.pack('<I', data_size))
+    if mime_type is None:
+        os.remove(output_path)
+    return mime_type
+
 def synthesize_speech_with_gemini(text: str, output_path: str, voice_name: str = "Aoede", api_key: str = None) -> Tuple[bool, str]:
     """Synthesize speech from text using Gemini TTS."""
     try:
@@ -26,7 +212,10 @@ def synthesize_speech_with_gemini(text: str, output_path: str, voice_name: str =
         
         # Set up the API endpoint
         model = "gemini-2.5-flash-exp-1219"
-        api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent?key={api_key}"
+        if copy_cached_speech(model, voice_name, text, output_path):
+            return True, "Speech loaded from cache"
+        
+        api_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent?alt=sse&key={api_key}"
         
         # Prepare the request payload
         payload = {
@@ -53,10 +242,10 @@ def synthesize_speech_with_gemini(text: str, output_path: str, voice_name: str =
             "Content-Type": "application/json"
         }
         
-        response = requests.post(api_url, headers=headers, data=json.dumps(payload))
+        response = http_session.post(api_url, headers=headers, data=json.dumps(payload, separators=(',', ':')), stream=True)
         
         if response.status_code != 200:
-            logger.error(f"Gemini TTS API error: {response.status_code} - {response.text}")
+            logger.error("Gemini TTS API error: %s - %s", response.status_code, response.text)
             # Parse error message if possible
             try:
                 error_data = response.json()
@@ -65,57 +254,72 @@ def synthesize_speech_with_gemini(text: str, output_path: str, voice_name: str =
             except:
                 return False, f"Gemini TTS API error: {response.status_code}"
         
-        # Parse the response
-        response_data = response.json()
-        
-        # Extract audio data from the response
-        audio_data = None
-        for item in response_data:
-            if "candidates" in item and len(item["candidates"]) > 0:
-                candidate = item["candidates"][0]
-                if "content" in candidate and "parts" in candidate["content"]:
-                    for part in candidate["content"]["parts"]:
-                        if "inlineData" in part and part["inlineData"]["mimeType"].startswith("audio/"):
-                            audio_data = part["inlineData"]["data"]
-                            break
-            if audio_data:
-                break
-        
-        if not audio_data:
+        # Audio is decoded event by event, so neither the whole response body nor
+        # the whole base64 payload is held in memory
+        mime_type = write_streamed_audio(response, output_path)
+        if not mime_type:
             logger.error("No audio data found in Gemini TTS response")
             return False, "No audio data found in response"
-        
-        # Decode base64 audio data and save to file
-        audio_bytes = base64.b64decode(audio_data)
-        
-        with open(output_path, "wb") as out:
-            out.write(audio_bytes)
-            logger.info(f"Audio content written to file: {output_path}")
+        logger.info("Audio content written to file: %s", output_path)
+        cache_speech(model, voice_name, text, output_path, mime_type)
             
         return True, "Speech synthesized successfully"
         
     except Exception as e:
-        logger.error(f"Error synthesizing speech with Gemini TTS: {str(e)}")
+        logger.error("Error synthesizing speech with Gemini TTS: %s", e)
         return False, f"Error synthesizing speech: {str(e)}"
 
+# Downloaded product images keyed by URL, so products and CSVs that share
+# images skip the fetch while the copy is fresh
+IMAGE_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'image_cache')
+IMAGE_CACHE_TTL = int(os.environ.get('IMAGE_CACHE_TTL', 86400))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_MB', 512)) * 1024 * 1024
+
+# Leading bytes of the image formats ffmpeg can decode; a 200 can still be an HTML
+# error or captive-portal page, which must neither be rendered nor cached
+IMAGE_MAGIC = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a', b'BM', b'II*\x00', b'MM\x00*')
+
+def _image_cache_path(url: str) -> str:
+    return os.path.join(IMAGE_CACHE_DIR, hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+def is_image_header(head: bytes) -> bool:
+    """Check leading file bytes for a known image signature."""
+    return (head.startswith(IMAGE_MAGIC)
+            or (head[:4] == b'RIFF' and head[8:12] == b'WEBP')
+            or head[4:8] == b'ftyp')  # AVIF/HEIF
+
 def download_image(url: str, save_path: str) -> Tuple[bool, str]:
     """Download an image from a URL and save it to the specified path."""
+    cache_path = _image_cache_path(url)
+    if cache_fetch(cache_path, save_path, max_age=IMAGE_CACHE_TTL, link=True):
+        return True, "Image loaded from cache"
+    
     try:
-        response = requests.get(url, timeout=30)
+        response = http_session.get(url, timeout=30, stream=True)
         response.raise_for_status()
         
-        with open(save_path, 'wb') as f:
-            f.write(response.content)
-            
-        return True, "Image downloaded successfully"
+        # Let urllib3 undo any gzip/deflate transfer encoding while copying
+        response.raw.decode_content = True
+        with response, open(save_path, 'wb') as f:
+            shutil.copyfileobj(response.raw, f)
+        
+        with open(save_path, 'rb') as f:
+            head = f.read(16)
     except Exception as e:
-        logger.error(f"Error downloading image from {url}: {str(e)}")
+        logger.error("Error downloading image from %s: %s", url, e)
         return False, f"Error downloading image: {str(e)}"
+    
+    if not is_image_header(head):
+        logger.error("URL did not return an image: %s", url)
+        os.remove(save_path)
+        return False, "URL did not return an image"
+    
+    cache_store(cache_path, save_path, IMAGE_CACHE_MAX_BYTES)
+    return True, "Image downloaded successfully"
 
+@lru_cache(maxsize=8)
 def create_wav_header(sample_rate: int = 24000, bits_per_sample: int = 16, channels: int = 1) -> bytes:
-    """Create a WAV file header."""
-    import struct
-    
+    """Create a WAV file header; headers are memoized per format."""
     # Calculate derived values
     byte_rate = sample_rate * channels * bits_per_sample // 8
     block_align = channels * bits_per_sample // 8
@@ -137,6 +341,20 @@ def create_wav_header(sample_rate: int = 24000, bits_per_sample: int = 16, chann
     
     return header
 
+def wav_duration(path: str) -> float:
+    """Duration of a WAV file from its header, or 0.0 if it isn't a readable WAV."""
+    try:
+        with wave.open(path, 'rb') as w:
+            return w.getnframes() / w.getframerate()
+    except (wave.Error, EOFError, OSError, ZeroDivisionError):
+        return 0.0
+
+def run_ffmpeg(cmd: List[str], timeout: float) -> subprocess.CompletedProcess:
+    """Run an ffmpeg command with only errors logged, returning stderr as text."""
+    cmd = [cmd[0], '-hide_banner', '-nostats', '-loglevel', 'error', *cmd[1:]]
+    return subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.PIPE, text=True, timeout=timeout)
+
 def convert_audio_to_wav(input_path: str, output_path: str) -> Tuple[bool, str]:
     """Convert audio file to WAV format using ffmpeg."""
     try:
@@ -150,14 +368,14 @@ def convert_audio_to_wav(input_path: str, output_path: str) -> Tuple[bool, str]:
             output_path
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        result = run_ffmpeg(cmd, timeout=120)
         
         if result.returncode != 0:
             error_msg = f"FFmpeg audio conversion failed: {result.stderr}"
             logger.error(error_msg)
             return False, error_msg
         
-        logger.info(f"Audio converted successfully: {output_path}")
+        logger.info("Audio converted successfully: %s", output_path)
         return True, "Audio converted successfully"
         
     except subprocess.TimeoutExpired:
@@ -196,10 +414,11 @@ def create_video_from_product_data(
         watermark: Watermark text
         outro_text: Outro text to append to narration
     """
+    temp_dir = None
     try:
         # Create temporary directory for assets
-        temp_dir = tempfile.mkdtemp(prefix="product_video_")
-        logger.info(f"Created temporary directory: {temp_dir}")
+        temp_dir = tempfile.mkdtemp(prefix="product_video_", dir=_scratch_dir())
+        logger.info("Created temporary directory: %s", temp_dir)
         
         # Extract product information
         product_title = product_data.get("Product Title", "")
@@ -220,20 +439,6 @@ def create_video_from_product_data(
             if key in product_data and product_data[key]:
                 image_urls.append(product_data[key])
         
-        # Download images
-        image_paths = []
-        for i, url in enumerate(image_urls):
-            if url and url.startswith('http'):
-                image_path = os.path.join(temp_dir, f"image_{i}.jpg")
-                success, message = download_image(url, image_path)
-                if success and os.path.exists(image_path):
-                    image_paths.append(image_path)
-                else:
-                    logger.warning(f"Failed to download image {i}: {message}")
-        
-        if not image_paths:
-            return False, "No valid images found for product"
-        
         # Create narration script
         narration_parts = []
         
@@ -260,11 +465,10 @@ def create_video_from_product_data(
         # Product description
         if product_description and product_description != "Not Available":
             # Split long descriptions into sentences
-            sentences = product_description.split('.')
-            for sentence in sentences:
-                sentence = sentence.strip()
-                if sentence and not sentence.lower().startswith("not available"):
-                    narration_parts.append(sentence)
+            narration_parts.extend(
+                sentence for sentence in map(str.strip, SENTENCE_SPLIT_RE.split(product_description))
+                if sentence and sentence[:len(NOT_AVAILABLE)].casefold() != NOT_AVAILABLE
+            )
         
         # Add outro text if provided
         if outro_text:
@@ -276,28 +480,47 @@ def create_video_from_product_data(
         if not full_narration.strip():
             return False, "No narration content generated"
         
-        # Synthesize speech
-        audio_path = os.path.join(temp_dir, "narration.mp3")
-        success, message = synthesize_speech_with_gemini(full_narration, audio_path, voice_name, api_key)
+        # Synthesize speech while the images download
+        audio_path = os.path.join(temp_dir, "narration_tts")
+        tts_future = io_pool.submit(synthesize_speech_with_gemini, full_narration, audio_path, voice_name, api_key)
         
-        if not success:
-            return False, f"Failed to synthesize speech: {message}"
+        # Download images
+        downloads = []
+        for i, url in enumerate(image_urls):
+            if url and url.startswith('http'):
+                image_path = os.path.join(temp_dir, f"image_{i}.jpg")
+                downloads.append((i, image_path, io_pool.submit(download_image, url, image_path)))
+        
+        image_paths = []
+        for i, image_path, future in downloads:
+            success, message = future.result()
+            if success and os.path.exists(image_path):
+                image_paths.append(image_path)
+            else:
+                logger.warning("Failed to download image %s: %s", i, message)
+        
+        success, message = tts_future.result()
         
-        # Convert audio to WAV for better compatibility
-        wav_audio_path = os.path.join(temp_dir, "narration.wav")
-        success, message = convert_audio_to_wav(audio_path, wav_audio_path)
+        if not image_paths:
+            return False, "No valid images found for product"
         
         if not success:
-            return False, f"Failed to convert audio: {message}"
+            return False, f"Failed to synthesize speech: {message}"
         
-        # Get audio duration
-        try:
-            cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', wav_audio_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            probe_data = json.loads(result.stdout)
-            audio_duration = float(probe_data['format']['duration'])
-        except Exception as e:
-            logger.warning(f"Could not determine audio duration, using estimated duration: {str(e)}")
+        # Gemini's PCM is already written as WAV; anything else is converted for better compatibility
+        wav_audio_path = audio_path
+        audio_duration = wav_duration(audio_path)
+        if not audio_duration:
+            wav_audio_path = os.path.join(temp_dir, "narration.wav")
+            success, message = convert_audio_to_wav(audio_path, wav_audio_path)
+            
+            if not success:
+                return False, f"Failed to convert audio: {message}"
+            
+            audio_duration = wav_duration(wav_audio_path)
+        
+        if not audio_duration:
+            logger.warning("Could not determine audio duration, using estimated duration")
             # Estimate based on number of characters (rough approximation)
             audio_duration = len(full_narration) / 15.0  # ~15 chars per second
         
@@ -305,148 +528,68 @@ def create_video_from_product_data(
         num_scenes = max(1, int(audio_duration / duration_per_scene))
         actual_duration_per_scene = audio_duration / num_scenes
         
-        # Create video scenes
-        scene_files = []
-        for i in range(num_scenes):
-            # Determine which image to use for this scene
-            image_index = min(i, len(image_paths) - 1)
-            image_path = image_paths[image_index]
-            
-            scene_path = os.path.join(temp_dir, f"scene_{i:03d}.png")
-            scene_files.append(scene_path)
-            
-            # Create scene with image (using ffmpeg for resizing and formatting)
-            cmd = [
-                'ffmpeg',
-                '-i', image_path,
-                '-vf', f'scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2,setsar=1',
-                '-y',
-                scene_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-            
-            if result.returncode != 0:
-                logger.warning(f"Failed to create scene {i}: {result.stderr}")
-                # Use a blank frame as fallback
-                cmd = [
-                    'ffmpeg',
-                    '-f', 'lavfi',
-                    '-i', 'color=c=black:s=1080x1920',
-                    '-vf', 'scale=1080:1920',
-                    '-vframes', '1',
-                    '-y',
-                    scene_path
-                ]
-                subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        # Create slideshow video
-        slideshow_path = os.path.join(temp_dir, "slideshow.mp4")
-        
-        # Create file list for slideshow
-        file_list_path = os.path.join(temp_dir, "file_list.txt")
-        with open(file_list_path, 'w') as f:
-            for scene_file in scene_files:
-                f.write(f"file '{scene_file}'\nduration {actual_duration_per_scene}\n")
-            # Add the last file again to ensure it's shown for the full duration
-            f.write(f"file '{scene_files[-1]}'\n")
-        
-        # Create slideshow with Ken Burns effect
-        cmd = [
-            'ffmpeg',
-            '-f', 'concat',
-            '-safe', '0',
-            '-i', file_list_path,
-            '-vf', 'zoompan=z=min(zoom+0.0015,1.5):x=(iw-iw/zoom)/2:y=(ih-ih/zoom)/2:d=250',
-            '-c:v', 'libx264',
-            '-pix_fmt', 'yuv420p',
-            '-y',
-            slideshow_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-        
-        if result.returncode != 0:
-            error_msg = f"FFmpeg slideshow creation failed: {result.stderr}"
-            logger.error(error_msg)
-            return False, error_msg
-        
+        # One input per image; scenes past the last image keep showing it
+        scene_images = image_paths[:num_scenes]
+        scene_counts = [1] * len(scene_images)
+        scene_counts[-1] += num_scenes - len(scene_images)
+        
+        # Scale, Ken Burns, subtitles, watermark and mux all run in a single ffmpeg
+        # invocation, so the frames are encoded exactly once
+        cmd = ['ffmpeg']
+        filters = []
+        for i, (image_path, count) in enumerate(zip(scene_images, scene_counts)):
+            cmd += ['-i', image_path]
+            frames = max(1, round(actual_duration_per_scene * count * VIDEO_FPS))
+            filters.append(
+                f"[{i}:v]scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2,setsar=1,"
+                f"zoompan=z='min(zoom+0.0015,1.5)':x='(iw-iw/zoom)/2':y='(ih-ih/zoom)/2':d={frames}:s=1080x1920:fps={VIDEO_FPS}[v{i}]"
+            )
+        cmd += ['-i', wav_audio_path]
+        audio_index = len(scene_images)
+        concat = ''.join(f"[v{i}]" for i in range(len(scene_images)))
+        filters.append(f"{concat}concat=n={len(scene_images)}:v=1:a=0[vcat]")
+        
+        overlays = []
         # Add subtitles if enabled
         if show_subtitles and full_narration:
-            subtitled_path = os.path.join(temp_dir, "subtitled.mp4")
-            
-            # Create subtitle file
             subtitle_path = os.path.join(temp_dir, "subtitles.srt")
             create_srt_file(full_narration, subtitle_path, audio_duration)
-            
-            # Burn subtitles into video
-            cmd = [
-                'ffmpeg',
-                '-i', slideshow_path,
-                '-vf', f"subtitles={subtitle_path}:force_style='FontName={font_style},FontSize={font_size},PrimaryColour=&H00FFFFFF,Outline=2,Shadow=1'",
-                '-c:v', 'libx264',
-                '-pix_fmt', 'yuv420p',
-                '-y',
-                subtitled_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-            
-            if result.returncode != 0:
-                logger.warning(f"Failed to add subtitles: {result.stderr}")
-                subtitled_path = slideshow_path
-        else:
-            subtitled_path = slideshow_path
+            overlays.append(f"subtitles={subtitle_path}:force_style='FontName={font_style},FontSize={font_size},PrimaryColour=&H00FFFFFF,Outline=2,Shadow=1'")
         
         # Add watermark if provided
         if watermark:
-            watermarked_path = os.path.join(temp_dir, "watermarked.mp4")
-            
-            cmd = [
-                'ffmpeg',
-                '-i', subtitled_path,
-                '-vf', f"drawtext=fontfile=/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf:text='{watermark}':fontcolor=white@0.8:fontsize=24:x=w-tw-10:y=10",
-                '-c:v', 'libx264',
-                '-pix_fmt', 'yuv420p',
+            # Read the text from a file so quotes, colons and % in it aren't parsed as filter syntax
+            watermark_path = os.path.join(temp_dir, "watermark.txt")
+            with open(watermark_path, 'w', encoding='utf-8') as f:
+                f.write(watermark)
+            overlays.append(f"drawtext=fontfile=/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf:textfile={watermark_path}:expansion=none:fontcolor=white@0.8:fontsize=24:x=w-tw-10:y=10")
+        
+        def encode(overlays):
+            chain = '[vcat]' + ','.join([*overlays, 'format=yuv420p']) + '[vout]'
+            return run_ffmpeg(cmd + [
+                '-filter_complex', ';'.join([*filters, chain]),
+                '-map', '[vout]',
+                '-map', f'{audio_index}:a',
+                *X264_ARGS,
+                '-c:a', 'aac',
+                '-shortest',
+                '-movflags', '+faststart',
                 '-y',
-                watermarked_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-            
-            if result.returncode != 0:
-                logger.warning(f"Failed to add watermark: {result.stderr}")
-                watermarked_path = subtitled_path
-        else:
-            watermarked_path = subtitled_path
+                output_path
+            ], timeout=600)
         
-        # Combine video and audio
-        cmd = [
-            'ffmpeg',
-            '-i', watermarked_path,
-            '-i', wav_audio_path,
-            '-c:v', 'copy',
-            '-c:a', 'aac',
-            '-strict', 'experimental',
-            '-y',
-            output_path
-        ]
+        result = encode(overlays)
         
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
+        if result.returncode != 0 and overlays:
+            logger.warning("Failed to add subtitles/watermark, rendering without them: %s", result.stderr)
+            result = encode([])
         
         if result.returncode != 0:
-            error_msg = f"FFmpeg video and audio combination failed: {result.stderr}"
+            error_msg = f"FFmpeg video creation failed: {result.stderr}"
             logger.error(error_msg)
             return False, error_msg
         
-        # Clean up temporary files
-        try:
-            import shutil
-            shutil.rmtree(temp_dir)
-        except Exception as e:
-            logger.warning(f"Failed to clean up temporary directory: {str(e)}")
-        
-        logger.info(f"Video created successfully: {output_path}")
+        logger.info("Video created successfully: %s", output_path)
         return True, "Video created successfully"
         
     except subprocess.TimeoutExpired:
@@ -457,6 +600,10 @@ def create_video_from_product_data(
         error_msg = f"Video creation error: {str(e)}"
         logger.error(error_msg)
         return False, error_msg
+    finally:
+        # Clean up temporary files, including after early returns and failures, off the result path
+        if temp_dir:
+            cleanup_pool.submit(shutil.rmtree, temp_dir, ignore_errors=True)
 
 def create_srt_file(text: str, output_path: str, total_duration: float) -> None:
     """Create an SRT subtitle file from text."""
@@ -469,30 +616,20 @@ def create_srt_file(text: str, output_path: str, total_duration: float) -> None:
         # Calculate duration per sentence
         sentence_duration = total_duration / len(sentences)
         
+        entries = [
+            f"{i+1}\n{format_time(i * sentence_duration)} --> {format_time((i + 1) * sentence_duration)}\n{sentence.strip()}\n\n"
+            for i, sentence in enumerate(sentences) if sentence.strip()
+        ]
         with open(output_path, 'w', encoding='utf-8') as f:
-            for i, sentence in enumerate(sentences):
-                if not sentence.strip():
-                    continue
-                    
-                start_time = i * sentence_duration
-                end_time = (i + 1) * sentence_duration
-                
-                # Format time as HH:MM:SS,mmm
-                start_str = format_time(start_time)
-                end_str = format_time(end_time)
-                
-                f.write(f"{i+1}\n")
-                f.write(f"{start_str} --> {end_str}\n")
-                f.write(f"{sentence.strip()}\n\n")
+            f.write(''.join(entries))
     except Exception as e:
-        logger.error(f"Error creating SRT file: {str(e)}")
+        logger.error("Error creating SRT file: %s", e)
 
 def format_time(seconds: float) -> str:
     """Format seconds as HH:MM:SS,mmm."""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int((seconds % 1) * 1000)
+    secs, millis = divmod(round(seconds * 1000), 1000)
+    minutes, secs = divmod(secs, 60)
+    hours, minutes = divmod(minutes, 60)
     return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
 
 def process_csv_and_create_videos(
@@ -535,8 +672,17 @@ def process_csv_and_create_videos(
             sample = f.read(1024)
             f.seek(0)
             sniffer = csv.Sniffer()
-            dialect = sniffer.sniff(sample)
-            has_header = sniffer.has_header(sample)
+            try:
+                # Only consider real delimiters; a failed guess falls back to plain comma CSV
+                dialect = sniffer.sniff(sample, delimiters=CSV_DELIMITERS)
+            except csv.Error:
+                dialect = csv.excel
+            try:
+                # has_header() sniffs again without the delimiter restriction, so it fails on the same samples
+                has_header = sniffer.has_header(sample)
+            except csv.Error:
+                # Product CSVs always start with a header row
+                has_header = True
             
             reader = csv.reader(f, dialect)
             
@@ -548,6 +694,9 @@ def process_csv_and_create_videos(
                 
             # Process each row (product)
             product_videos = []
+            jobs = []
+            output_names = set()
+            renders = {}
             for row_num, row in enumerate(reader):
                 # Create product data dictionary
                 product_data = {}
@@ -575,15 +724,30 @@ def process_csv_and_create_videos(
                         if col_index < len(row):
                             product_data[field_name] = row[col_index]
                 
+                # A row repeated in the CSV (e.g. merged catalogs) reuses the first render
+                row_key = json.dumps(product_data, sort_keys=True)
+                if row_key in renders:
+                    jobs.append((row_num, product_data, *renders[row_key]))
+                    continue
+                
                 # Create a separate output path for this product
                 safe_title = "".join(c for c in product_data.get("Product Title", f"product_{row_num}") if c.isalnum() or c in (' ', '-', '_')).rstrip()
                 if not safe_title:
                     safe_title = f"product_{row_num}"
                 
-                output_path = os.path.join(output_dir, f"{safe_title.replace(' ', '_')}.mp4")
+                base_name = safe_title.replace(' ', '_')
+                output_name = f"{base_name}.mp4"
+                suffix = row_num
+                while output_name in output_names:
+                    # Products render concurrently, so repeated titles must not share an output file
+                    output_name = f"{base_name}_{suffix}.mp4"
+                    suffix += 1
+                output_names.add(output_name)
+                output_path = os.path.join(output_dir, output_name)
                 
                 # Create video for this product
-                success, message = create_video_from_product_data(
+                future = product_pool.submit(
+                    create_video_from_product_data,
                     product_data,
                     output_path,
                     duration_per_scene,
@@ -595,6 +759,11 @@ def process_csv_and_create_videos(
                     watermark,
                     outro_text
                 )
+                renders[row_key] = (output_path, future)
+                jobs.append((row_num, product_data, output_path, future))
+            
+            for row_num, product_data, output_path, future in jobs:
+                success, message = future.result()
                 
                 if success:
                     product_videos.append({
@@ -604,7 +773,7 @@ def process_csv_and_create_videos(
                         'message': message
                     })
                 else:
-                    logger.error(f"Failed to create video for product {row_num}: {message}")
+                    logger.error("Failed to create video for product %s: %s", row_num, message)
                     product_videos.append({
                         'product_id': row_num,
                         'output_path': None,
@@ -624,7 +793,7 @@ def process_csv_and_create_videos(
                 return False, [{"error": True, "message": "No valid products found in CSV file"}]
             
     except Exception as e:
-        logger.error(f"Error processing CSV file: {str(e)}")
+        logger.error("Error processing CSV file: %s", e)
         return False, [{"error": True, "message": f"Error processing CSV file: {str(e)}"}]
 
 # Example usage
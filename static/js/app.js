@@ -3,6 +3,9 @@ class VideoConverter {
         this.currentFileId = null;
         this.downloadUrl = null;
         this.queueInterval = null;
+        this.queueEvents = null;
+        this.queueEventsEnabled = false;
+        this.queueState = {};
         this.initializeEventListeners();
         this.checkApiStatus();
         // Check queue status immediately on page load
@@ -528,6 +531,11 @@ class VideoConverter {
             const response = await axios.get('/api/status');
             const data = response.data;
             
+            if (data.queue_events && !this.queueEventsEnabled) {
+                this.queueEventsEnabled = true;
+                this.startQueuePolling();
+            }
+            
             const statusCard = document.getElementById('statusCard');
             const statusSpinner = document.getElementById('statusSpinner');
             const statusText = document.getElementById('statusText');
@@ -568,6 +576,26 @@ class VideoConverter {
     }
 
     startQueuePolling() {
+        // Use server-pushed updates only where the server enables them; the browser reconnects the stream by itself
+        if (this.queueEventsEnabled && window.EventSource) {
+            if (this.queueInterval) {
+                clearInterval(this.queueInterval);
+                this.queueInterval = null;
+            }
+            if (!this.queueEvents) {
+                this.queueEvents = new EventSource('/api/queue-events');
+                this.queueEvents.addEventListener('snapshot', (event) => {
+                    this.queueState = JSON.parse(event.data);
+                    this.renderQueueStatus(this.queueState);
+                });
+                this.queueEvents.onmessage = (event) => {
+                    Object.assign(this.queueState, JSON.parse(event.data));
+                    this.renderQueueStatus(this.queueState);
+                };
+            }
+            return;
+        }
+        
         // Clear any existing interval
         if (this.queueInterval) {
             clearInterval(this.queueInterval);